@@ -1,15 +1,32 @@
 import argparse
+import asyncio
+import bisect
+import csv
+import io
+import glob
+import json
+import math
 from flask import Flask, render_template_string, Response, jsonify, request
 from flask_socketio import SocketIO, emit
 import cv2
 import threading
 import time
 import requests
+from requests.adapters import HTTPAdapter
+import aiohttp
 from ultralytics import YOLO
 import sqlite3
 import os
 import numpy as np
 import logging
+import queue
+import multiprocessing
+from multiprocessing import shared_memory
+import atexit
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from types import SimpleNamespace
 from datetime import datetime, timezone
 
 # Настройки
@@ -20,14 +37,92 @@ PROCESSING_INTERVAL = 1  # Интервал обработки кадров (в
 MAX_RETRY_ATTEMPTS = 5  # Максимальное количество попыток повторного подключения
 NUM_SEC_FOR_SAVE_CAR_TO_DATABASE = 6  # Количество секунд для сохранения данных в базу данных
 SEC_NO_DETECT_CAR = 2  # Количество секунд без детекции номера
-FETCH_IMAGE_DELAY = 0.1  # Задержка при получении изображения (в секундах)
+FETCH_IMAGE_DELAY = 0.1  # Минимальная пауза между кадрами камеры (в секундах)
 SAVE_DATASET = True  # Флаг для сохранения данных в датасет
 SEARCH_TIME_WINDOW = 300  # Время поиска номера в базе (в секундах)
+PLATE_CACHE_FLUSH_INTERVAL = 5  # Интервал записи накопленных match_count и time_in_view в базу (в секундах)
 LOG_TO_FILE = True  # Флаг для сохранения логов в файл
 LOG_FILE_PATH = "app.log"  # Путь к файлу логов
-SUCCESS_RATE_THRESHOLD = 0.6  # Порог успешного распознавания (60%)
-RECENT_ATTEMPTS = 5  # Количество последних попыток для оценки успешного распознавания
-CAMERA_CHECK_INTERVAL = 10  # Интервал проверки изменений в базе данных камер (в секундах)
+TRACK_IOU_THRESHOLD = 0.3  # Минимальное пересечение рамок (IoU) для продолжения трека номера
+TRACK_CENTROID_DISTANCE = 1.0  # Максимальное смещение центра рамки между кадрами (в ширинах рамки)
+TRACK_MIN_HITS = 3  # Минимальное количество кадров с номером для сохранения трека
+TRACK_CONVERGENCE = 0.8  # Доля голосов за каждый символ, при которой номер трека считается установленным
+ACTIVE_PROCESSING_INTERVAL = 0.25  # Интервал обработки кадров, пока номер в кадре (в секундах)
+IDLE_PROCESSING_INTERVAL = 2  # Интервал обработки кадров для простаивающей камеры (в секундах)
+IDLE_AFTER_SEC = 10  # Время без детекции, после которого камера считается простаивающей (в секундах)
+CPU_BUDGET = 0.8  # Допустимая загрузка всех ядер CPU обработкой камер (доля от 1)
+CPU_LOAD_WINDOW = 1  # Окно усреднения загрузки CPU (в секундах)
+DB_READ_POOL_SIZE = 4  # Количество переиспользуемых соединений SQLite для чтения
+DB_WRITE_BATCH_SIZE = 100  # Максимальное количество запросов записи в одной транзакции
+DB_WRITE_MAX_WAIT = 0.05  # Максимальное время накопления запросов записи перед коммитом (в секундах)
+DB_BUSY_TIMEOUT = 5  # Время ожидания блокировки базы данных (в секундах)
+RECORD_BACKFILL_BATCH_SIZE = 5000  # Количество записей, переводимых на новый формат времени за одну транзакцию
+DATASET_WRITER_WORKERS = 2  # Количество потоков записи датасета на диск
+DATASET_WRITER_QUEUE_SIZE = 64  # Максимальное количество ожидающих записи наборов файлов
+DATASET_QUEUE_POLICY = 'drop'  # Поведение при заполненной очереди: 'drop' - отбросить, 'block' - ждать освобождения
+DATASET_QUEUE_BLOCK_TIMEOUT = 1  # Максимальное время ожидания места в очереди в режиме 'block' (в секундах)
+DATASET_IMAGE_FORMAT = 'jpg'  # Формат сохраняемых изображений: 'jpg', 'png' или 'webp'
+DATASET_JPEG_QUALITY = 95  # Качество сжатия JPEG/WebP (0-100)
+INFERENCE_BATCH_SIZE = 8  # Максимальный размер батча для инференса моделей
+INFERENCE_MAX_WAIT = 0.05  # Максимальное время ожидания формирования батча (в секундах)
+SYMBOL_CROP_SIZE = None  # Размер (ширина, высота), в который вписываются платы с сохранением пропорций перед батчем модели символов (None - без изменения)
+FRAME_BUS_TIMEOUT = 5  # Время ожидания нового кадра для видеопотока (в секундах)
+CAMERA_CONNECT_TIMEOUT = 3  # Таймаут установки соединения с камерой (в секундах)
+CAMERA_READ_TIMEOUT = 10  # Таймаут чтения ответа камеры (в секундах)
+CAMERA_BACKOFF_BASE = 0.5  # Начальная задержка между повторными попытками (в секундах)
+CAMERA_BACKOFF_MAX = 30  # Максимальная задержка между повторными попытками (в секундах)
+CAPTURE_MODES = ('auto', 'snapshot', 'stream')  # Режимы получения кадров камеры
+STREAM_URL_SCHEMES = ('rtsp://', 'rtsps://', 'rtmp://')  # Схемы URL, которые всегда читаются как поток
+MOTION_THRESHOLD = 0.002  # Доля изменившихся пикселей ROI, при которой сцена считается изменившейся (0 - без фильтра)
+MOTION_PIXEL_DELTA = 25  # Минимальное изменение яркости пикселя для фильтра движения
+MOTION_FRAME_WIDTH = 160  # Ширина уменьшенной ROI для фильтра движения (в пикселях)
+MOTION_MAX_SKIPPED_FRAMES = 30  # Максимальное количество пропущенных подряд кадров до принудительной обработки
+ENHANCE_MODES = ('full', 'luma', 'none')  # Режимы улучшения контраста: CLAHE по L в LAB, CLAHE по Y в YCrCb, без улучшения
+WORKER_PROCESSES = 0  # Количество процессов обработки камер (0 - камеры обрабатываются в процессе веб-сервера), задается аргументом --workers
+WORKER_STATUS_INTERVAL = 1  # Интервал отправки состояния камер и метрик процессом обработки (в секундах)
+WORKER_EVENT_QUEUE_SIZE = 256  # Максимальное количество ожидающих событий от процессов обработки (кадры сверх него отбрасываются)
+WORKER_RESTART_INTERVAL = 10  # Интервал проверки и перезапуска завершившихся процессов обработки (в секундах)
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Границы корзин гистограмм задержек этапов (в секундах)
+METRICS_FPS_SMOOTHING = 0.2  # Коэффициент сглаживания частоты кадров камеры (0-1)
+FRAME_RING_SLOTS = 16  # Количество слотов кольцевого буфера кадров в разделяемой памяти на процесс обработки
+FRAME_RING_SLOT_SIZE = 24 * 1024 * 1024  # Размер слота для кадра (в байтах), вмещает кадр BGR 3840x2160; большие кадры передаются через очередь
+PLATE_MODEL_PATH = "models/plate.pt"  # Модель плат при запуске: .pt, .onnx или директория *_openvino_model
+SYMBOL_MODEL_PATH = "models/symbols.pt"  # Модель символов при запуске: .pt, .onnx или директория *_openvino_model
+MODEL_BACKENDS = ('torch', 'onnx', 'openvino')  # Бэкенды инференса: PyTorch через ultralytics, ONNX Runtime, OpenVINO
+PLATE_MODEL_BACKEND = None  # Бэкенд модели плат (None - по расширению файла модели)
+SYMBOL_MODEL_BACKEND = None  # Бэкенд модели символов (None - по расширению файла модели)
+PLATE_MODEL_IMGSZ = (640, 640)  # Размер входа модели плат ONNX/OpenVINO без размера, зафиксированного при экспорте (высота, ширина)
+SYMBOL_MODEL_IMGSZ = (96, 320)  # Размер входа модели символов ONNX/OpenVINO без размера, зафиксированного при экспорте (высота, ширина)
+INFERENCE_THREADS = 0  # Количество потоков инференса модели (0 - ядра CPU, поделенные между процессами обработки)
+MODEL_MIN_CONFIDENCE = 0.25  # Минимальная уверенность рамок в выходе моделей ONNX/OpenVINO до NMS
+MODEL_NMS_IOU = 0.7  # Порог IoU подавления немаксимумов для моделей ONNX/OpenVINO
+MODEL_WARMUP_FRAMES = 4  # Количество кадров из датасета для прогрева новой модели перед подменой
+MODEL_WARMUP_RUNS = 3  # Количество прогонов батча прогрева
+QUANTIZED_MAX_ACCURACY_DROP = 0.01  # Допустимое снижение посимвольной точности квантованной модели символов (доля от 1)
+QUANTIZED_OP_TYPES = ('QuantizeLinear', 'DequantizeLinear', 'QLinearConv', 'QLinearMatMul', 'ConvInteger', 'MatMulInteger', 'FakeQuantize')  # Операции графа квантованной модели ONNX/OpenVINO
+FRAME_RING_HEADER_SIZE = 32  # Размер заголовка слота: счетчик записи, высота, ширина, число каналов (в байтах)
+INGEST_ENGINES = ('asyncio', 'threads')  # Опрос камер-снимков: общий цикл событий или поток на камеру
+INGEST_ENGINE = 'asyncio'  # Движок опроса камер-снимков (потоковые камеры всегда читаются своим потоком)
+INGEST_MAX_CONNECTIONS = 256  # Максимальное количество одновременных HTTP-соединений цикла событий с камерами
+FRAME_PROCESSING_WORKERS = 16  # Количество потоков декодирования и обработки кадров, полученных циклом событий
+RECORDS_PAGE_SIZE = 100  # Количество записей на странице /records по умолчанию
+RECORDS_MAX_PAGE_SIZE = 1000  # Максимальное количество записей на странице /records
+RECORDS_EXPORT_BATCH_SIZE = 1000  # Количество записей, читаемых за один запрос при выгрузке /records/export
+STATUS_EMIT_MIN_INTERVAL = 0.5  # Минимальный интервал между обновлениями статуса, отправляемыми одному клиенту WebSocket (в секундах)
+OUTBOX_URL = None  # Адрес вышестоящего сервера для доставки распознаваний (None - доставка отключена), задается аргументом --outbox-url
+OUTBOX_BATCH_SIZE = 100  # Максимальное количество записей в одном запросе доставки
+OUTBOX_POLL_INTERVAL = 1  # Интервал проверки новых неотправленных записей (в секундах)
+OUTBOX_CONNECT_TIMEOUT = 3  # Таймаут установки соединения с вышестоящим сервером (в секундах)
+OUTBOX_READ_TIMEOUT = 30  # Таймаут ответа вышестоящего сервера (в секундах)
+OUTBOX_BACKOFF_BASE = 1  # Начальная задержка повторной доставки после ошибки (в секундах)
+OUTBOX_BACKOFF_MAX = 300  # Максимальная задержка повторной доставки (в секундах)
+OUTBOX_THROUGHPUT_WINDOW = 60  # Окно расчета скорости доставки записей (в секундах)
+
+# Заполнение времени в секундах эпохи для записей, созданных до миграции 2
+RECORD_TIME_BACKFILL_SQL = """
+    UPDATE record SET time = CAST(strftime('%s', datetime) AS INTEGER)
+    WHERE id > ? AND id <= ? AND time IS NULL
+"""
 
 # Словарь для преобразования индексов классов в символы
 CLASS_TO_SYMBOL = {
@@ -44,17 +139,113 @@ app = Flask(__name__)
 socketio = SocketIO(app)
 
 # Глобальные переменные для хранения состояния
-detection_states = {}
-source_names = []
+# Состояние выполнения камер хранится по id камеры: URL - только поле настроек, и у разных камер он может совпадать
+detection_states = {}  # Состояние детекции по id камеры
 rect_cam = {}
 stop_events = {}
-threads = []
+threads = {}  # Поток или задача цикла событий каждой камеры
+
+# Реестр камер по id с их настройками; изменения приходят событиями от эндпоинтов API
+camera_registry = {}
+camera_events = queue.Queue()
+
+# Версии статуса камер: при событии детекции камера получает следующий номер последовательности
+# и переносится в конец словаря, поэтому изменения после номера N находятся с конца без обхода всех камер
+status_sequence = 0
+camera_versions = {}
+status_lock = threading.Lock()
+status_changed = threading.Event()
+status_clients = {}  # sid клиента WebSocket -> последний отправленный номер последовательности и время отправки
+
+# Очередь запросов на инференс от потоков камер
+inference_queue = queue.Queue()
+
+# Постоянные HTTP-сессии и статистика получения кадров по id камеры
+camera_sessions = {}
+camera_stats = {}
+camera_lock = threading.Lock()
+
+# Замер загрузки CPU процессом для общего бюджета камер
+cpu_monitor = {'wall': time.monotonic(), 'cpu': time.process_time(), 'load': 0.0}
+cpu_monitor_lock = threading.Lock()
+
+# Последние декодированные кадры потоковых камер по id камеры
+stream_slots = {}
+stream_lock = threading.Lock()
+
+# Цикл событий опроса камер-снимков, его HTTP-сессия и пул обработки кадров
+ingest_loop = None
+ingest_session = None
+frame_executor = None
+ingest_lock = threading.Lock()
+
+# Пул соединений для чтения, очередь единственного потока записи в SQLite и метрики коммитов
+db_read_pool = queue.Queue(maxsize=DB_READ_POOL_SIZE)
+db_write_queue = queue.Queue()
+db_metrics = {'transactions': 0, 'statements': 0, 'errors': 0, 'last_commit_ms': 0.0, 'avg_commit_ms': 0.0, 'max_commit_ms': 0.0}
+db_metrics_lock = threading.Lock()
+
+# Недавно сохраненные номера по (номер, камера) для поиска повторов без обращения к базе
+plate_cache = {}
+plate_cache_pending = []  # Несохраненные счетчики вытесненных из кэша записей (match_count, time_in_view, id записи)
+plate_cache_lock = threading.Lock()
+
+# Очередь фоновой записи датасета и ее метрики
+dataset_queue = queue.Queue(maxsize=DATASET_WRITER_QUEUE_SIZE)
+dataset_metrics = {'queued': 0, 'written': 0, 'dropped': 0, 'errors': 0, 'last_write_ms': 0.0, 'avg_write_ms': 0.0}
+dataset_metrics_lock = threading.Lock()
+
+# Метрики доставки записей вышестоящему серверу
+outbox_metrics = {'delivered': 0, 'rejected': 0, 'batches': 0, 'failures': 0, 'consecutive_failures': 0, 'last_status': None,
+                  'last_error': None, 'last_batch_ms': 0.0, 'avg_batch_ms': 0.0, 'last_delivery_lag_sec': 0.0}
+outbox_deliveries = deque()  # (время доставки, количество записей) за окно OUTBOX_THROUGHPUT_WINDOW
+outbox_metrics_lock = threading.Lock()
+outbox_start_id = None  # id последней записи, сохраненной до появления доставки; читается из outbox_state при первом обращении
+
+# Последние обработанные кадры камер по id камеры, общие для всех зрителей видеопотока
+frame_bus = {}
+frame_bus_viewers = {}  # Количество зрителей видеопотока по id камеры в процессе веб-сервера
+frame_bus_lock = threading.Lock()
+
+# Процессы обработки камер: номер и очередь событий текущего процесса обработки,
+# а в процессе веб-сервера - очереди команд, процессы и последние присланные ими метрики
+worker_index = None
+worker_events = None
+worker_commands = []
+worker_processes = []
+worker_metrics = {}
+worker_metrics_lock = threading.Lock()
+worker_model_updates = {}  # Последняя команда обновления каждой модели, повторяемая перезапущенному процессу
+
+# Кольцевые буферы кадров в разделяемой памяти: по номеру процесса обработки в процессе веб-сервера,
+# собственный буфер в процессе обработки
+frame_rings = {}
+frame_ring = None
+viewed_cameras = frozenset()  # Камеры процесса обработки, у которых есть зрители: кадры передаются только для них
+frame_ring_metrics = {'ring_frames': 0, 'queue_frames': 0}  # Кадры, переданные через буфер и через очередь из-за нехватки места в слоте
+frame_ring_oversized = set()  # Камеры, о кадрах которых больше слота уже предупреждали в логе
+frame_ring_metrics_lock = threading.Lock()
+
+# Реестр моделей: активная версия каждого типа, ожидающая загрузки версия и последняя ошибка загрузки.
+# Вызовы инференса захватывают версию на время батча, замененная версия освобождается после завершения всех вызовов
+model_registry = {'plate': None, 'symbol': None}
+model_status = {model_type: {'pending_version': None, 'last_error': None} for model_type in model_registry}
+model_registry_lock = threading.Lock()
+model_load_lock = threading.Lock()
+model_versions = {'plate': 1, 'symbol': 1}  # Последние выданные номера версий (при запуске загружается версия 1)
 
 # Глобальные переменные для хранения метрик
 model_metrics = {
     'plate': {'total_frames': 0, 'detected_frames': 0, 'accuracy': 0.0},
     'symbol': {'total_frames': 0, 'detected_frames': 0, 'accuracy': 0.0}
 }
+model_metrics_lock = threading.Lock()
+
+# Гистограммы задержек этапов обработки по (этап, камера) и время последнего кадра камер для расчета FPS
+stage_metrics = {}
+stage_metrics_lock = threading.Lock()
+camera_frame_times = {}
+worker_event_queue = None  # Очередь событий от процессов обработки в процессе веб-сервера
 
 # Настройка логирования
 if LOG_TO_FILE:
@@ -63,11 +254,94 @@ if LOG_TO_FILE:
 else:
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-def create_table_if_not_exists():
-    """Создает таблицы record и cameras, если они не существуют."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
+def connect_db():
+    """Открывает соединение с SQLite в режиме WAL."""
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+@contextmanager
+def db_read_connection():
+    """Выдает соединение для чтения из пула и возвращает его обратно."""
+    try:
+        conn = db_read_pool.get_nowait()
+    except queue.Empty:
+        conn = connect_db()
+    try:
+        yield conn
+    finally:
+        try:
+            db_read_pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+def db_read(sql, params=()):
+    """Выполняет запрос на чтение через пул соединений."""
+    with db_read_connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+def db_write(sql, params=(), wait=False, many=False):
+    """Ставит запрос в очередь потока записи; при wait=True дожидается коммита и возвращает (lastrowid, rowcount)."""
+    item = {'sql': sql, 'params': params, 'many': many, 'event': threading.Event() if wait else None, 'result': None, 'error': None}
+    db_write_queue.put(item)
+    if not wait:
+        return None
+    item['event'].wait()
+    if item['error'] is not None:
+        raise item['error']
+    return item['result']
+
+def db_writer():
+    """Единственный поток записи: объединяет запросы из очереди в транзакции."""
+    conn = connect_db()
+    while True:
+        batch = collect_batch(db_write_queue, DB_WRITE_BATCH_SIZE, DB_WRITE_MAX_WAIT)
+        start = time.monotonic()
+        errors = 0
+        for item in batch:
+            try:
+                if item['many']:
+                    cursor = conn.executemany(item['sql'], item['params'])
+                else:
+                    cursor = conn.execute(item['sql'], item['params'])
+                item['result'] = (cursor.lastrowid, cursor.rowcount)
+            except sqlite3.Error as e:
+                logging.error(f"Ошибка записи в SQLite: {e}")
+                logging.error(f"Данные: {item['params']}")
+                item['error'] = e
+                errors += 1
+        try:
+            conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Ошибка коммита транзакции SQLite: {e}")
+            conn.rollback()
+            for item in batch:
+                item['error'] = e
+            errors = len(batch)
+
+        commit_ms = (time.monotonic() - start) * 1000
+        with db_metrics_lock:
+            db_metrics['transactions'] += 1
+            db_metrics['statements'] += len(batch)
+            db_metrics['errors'] += errors
+            db_metrics['last_commit_ms'] = commit_ms
+            db_metrics['avg_commit_ms'] += (commit_ms - db_metrics['avg_commit_ms']) / db_metrics['transactions']
+            db_metrics['max_commit_ms'] = max(db_metrics['max_commit_ms'], commit_ms)
+
+        for item in batch:
+            if item['event'] is not None:
+                item['event'].set()
+
+def add_column_if_missing(conn, table, column, definition):
+    """Добавляет столбец в таблицу, если его еще нет."""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def migration_base_schema(conn):
+    """Миграция 1: таблицы record и cameras, включая столбцы, добавленные до версионирования схемы."""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS record (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             datetime TEXT,
@@ -88,7 +362,7 @@ def create_table_if_not_exists():
             time_in_view REAL
         )
     """)
-    cursor.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS cameras (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             url TEXT NOT NULL,
@@ -99,100 +373,754 @@ def create_table_if_not_exists():
             name TEXT NOT NULL
         )
     """)
-    conn.commit()
-    conn.close()
+    add_column_if_missing(conn, "record", "match_count", "INTEGER")
+    add_column_if_missing(conn, "record", "time_in_view", "REAL")
+    add_column_if_missing(conn, "cameras", "capture_mode", "TEXT")
+    add_column_if_missing(conn, "cameras", "enhance_mode", "TEXT")
+    add_column_if_missing(conn, "cameras", "motion_threshold", "REAL")
+
+def migration_record_time_index(conn):
+    """Миграция 2: время записи в секундах эпохи и составной индекс для поиска повторов номера."""
+    add_column_if_missing(conn, "record", "time", "INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_record_key_source_time ON record (key, source, time)")
+
+def migration_record_listing_index(conn):
+    """Миграция 3: индексы постраничной выборки записей по времени, в том числе для одного источника."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_record_time_id ON record (time, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_record_source_time_id ON record (source, time, id)")
+
+def migration_record_outbox(conn):
+    """Миграция 4: счетчик и время доставки записей, частичный индекс неотправленных записей и граница прежних записей."""
+    add_column_if_missing(conn, "record", "send_attempts", "INTEGER")
+    add_column_if_missing(conn, "record", "send_time", "INTEGER")
+    # Прежние записи не ждут доставки: вместо перезаписи каждой из них запоминается последний id,
+    # иначе включение OUTBOX_URL выгрузило бы всю историю
+    conn.execute("CREATE TABLE IF NOT EXISTS outbox_state (id INTEGER PRIMARY KEY CHECK (id = 1), start_id INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO outbox_state (id, start_id) SELECT 1, COALESCE(MAX(id), 0) FROM record")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_record_unsent ON record (id) WHERE send_to_server_code = 0")
+
+# Миграции схемы по порядку; номер версии хранится в PRAGMA user_version
+MIGRATIONS = [
+    migration_base_schema,
+    migration_record_time_index,
+    migration_record_listing_index,
+    migration_record_outbox,
+]
+
+def apply_migrations(conn):
+    """Применяет недостающие миграции схемы, каждую в отдельной транзакции."""
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # Явное управление транзакциями, чтобы DDL откатывался вместе с версией
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            logging.info(f"Применение миграции базы данных {number}: {migration.__doc__}")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return len(MIGRATIONS)
+    finally:
+        conn.isolation_level = isolation_level
 
-def migrate_table():
-    """Обновляет таблицы record и cameras, добавляя новые столбцы, если они отсутствуют."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def migrate_database():
+    """Приводит схему базы данных к актуальной версии."""
+    conn = connect_db()
     try:
-        cursor.execute("ALTER TABLE record ADD COLUMN match_count INTEGER")
-        cursor.execute("ALTER TABLE record ADD COLUMN time_in_view REAL")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass  # Столбцы уже существуют
+        apply_migrations(conn)
     finally:
         conn.close()
 
-def fetch_image_from_url(url, delay):
-    """Получает изображение по HTTP с задержкой."""
-    try:
-        time.sleep(delay)  # Задержка перед получением изображения
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        img_array = np.asarray(bytearray(response.content), dtype=np.uint8)
-        frame = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-        if frame is not None:
-            return frame
-    except Exception as e:
-        logging.error(f"Ошибка при попытке получения изображения с камеры {url}: {e}")
+def backfill_record_time(conn=None):
+    """Заполняет столбец time старых записей короткими транзакциями, не останавливая запись новых."""
+    if conn is None:
+        min_id, max_id = db_read("SELECT MIN(id), MAX(id) FROM record WHERE time IS NULL")[0]
+    else:
+        min_id, max_id = conn.execute("SELECT MIN(id), MAX(id) FROM record WHERE time IS NULL").fetchone()
+    if min_id is None:
+        return 0
+
+    updated = 0
+    for start_id in range(min_id - 1, max_id, RECORD_BACKFILL_BATCH_SIZE):
+        params = (start_id, start_id + RECORD_BACKFILL_BATCH_SIZE)
+        if conn is None:
+            updated += db_write(RECORD_TIME_BACKFILL_SQL, params, wait=True)[1]
+        else:
+            updated += conn.execute(RECORD_TIME_BACKFILL_SQL, params).rowcount
+            conn.commit()
+    logging.info(f"Заполнено время для {updated} записей")
+    return updated
+
+def new_camera_stats():
+    """Создает пустую статистику получения кадров камеры."""
+    return {
+        'requests': 0,
+        'errors': 0,
+        'consecutive_errors': 0,
+        'dropped_frames': 0,
+        'processed_frames': 0,
+        'skipped_frames': 0,
+        'fps': 0.0,
+        'last_latency_ms': 0.0,
+        'avg_latency_ms': 0.0,
+        'last_error': None
+    }
+
+def get_camera_session(camera_id):
+    """Возвращает постоянную HTTP-сессию камеры с keep-alive соединением."""
+    with camera_lock:
+        session = camera_sessions.get(camera_id)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+            camera_sessions[camera_id] = session
+            camera_stats.setdefault(camera_id, new_camera_stats())
+        return session
+
+def close_camera_session(camera_id):
+    """Закрывает HTTP-сессию камеры и удаляет ее статистику."""
+    with camera_lock:
+        session = camera_sessions.pop(camera_id, None)
+        camera_stats.pop(camera_id, None)
+        camera_frame_times.pop(camera_id, None)
+    if session is not None:
+        session.close()
+
+def reset_camera_session(camera_id):
+    """Сбрасывает соединения камеры, сохраняя статистику."""
+    with camera_lock:
+        session = camera_sessions.pop(camera_id, None)
+    if session is not None:
+        session.close()
+
+def record_fetch_result(camera_id, latency, error):
+    """Обновляет задержку и счетчики ошибок получения кадров камеры; latency=None - ошибка уже учтенного запроса, без задержки."""
+    with camera_lock:
+        stats = camera_stats.get(camera_id)
+        if stats is None:
+            return
+        if latency is not None:
+            latency_ms = latency * 1000
+            stats['requests'] += 1
+            stats['last_latency_ms'] = latency_ms
+            stats['avg_latency_ms'] += (latency_ms - stats['avg_latency_ms']) / stats['requests']
+        if error is None:
+            stats['consecutive_errors'] = 0
+        else:
+            stats['errors'] += 1
+            stats['consecutive_errors'] += 1
+            stats['last_error'] = str(error)
+
+def record_motion_result(camera_id, skipped):
+    """Учитывает обработанный или пропущенный фильтром движения кадр камеры и обновляет ее частоту кадров."""
+    now = time.monotonic()
+    with camera_lock:
+        stats = camera_stats.get(camera_id)
+        if stats is not None:
+            stats['skipped_frames' if skipped else 'processed_frames'] += 1
+            last_time = camera_frame_times.get(camera_id)
+            if last_time is not None and now > last_time:
+                stats['fps'] += METRICS_FPS_SMOOTHING * (1 / (now - last_time) - stats['fps'])
+            camera_frame_times[camera_id] = now
+
+def observe_stage(stage, source_name, seconds):
+    """Учитывает длительность этапа обработки кадра камеры в гистограмме."""
+    index = bisect.bisect_left(METRICS_LATENCY_BUCKETS, seconds)
+    with stage_metrics_lock:
+        histogram = stage_metrics.get((stage, source_name))
+        if histogram is None:
+            histogram = stage_metrics[(stage, source_name)] = {'counts': [0] * (len(METRICS_LATENCY_BUCKETS) + 1), 'sum': 0.0}
+        histogram['counts'][index] += 1
+        histogram['sum'] += seconds
+
+def histogram_quantile(quantile, counts):
+    """Оценивает квантиль по счетчикам корзин METRICS_LATENCY_BUCKETS линейной интерполяцией внутри корзины, как Prometheus."""
+    total = sum(counts)
+    if total == 0:
+        return 0.0
+    rank = quantile * total
+    cumulative = 0
+    for index, count in enumerate(counts):
+        if cumulative + count >= rank and count:
+            if index == len(METRICS_LATENCY_BUCKETS):
+                return METRICS_LATENCY_BUCKETS[-1]  # Значение выше последней границы
+            lower = METRICS_LATENCY_BUCKETS[index - 1] if index else 0.0
+            return lower + (METRICS_LATENCY_BUCKETS[index] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return METRICS_LATENCY_BUCKETS[-1]
+
+def get_backoff_delay(camera_id, delay):
+    """Возвращает задержку перед запросом с экспоненциальным ростом после ошибок."""
+    with camera_lock:
+        failures = camera_stats.get(camera_id, {}).get('consecutive_errors', 0)
+    if failures == 0:
+        return delay
+    return min(CAMERA_BACKOFF_BASE * 2 ** (failures - 1), CAMERA_BACKOFF_MAX)
+
+def fetch_image_from_url(camera_id, url, delay, stop_event=None, source_name=None):
+    """Получает изображение по HTTP с задержкой, таймаутами и повторными попытками."""
+    session = get_camera_session(camera_id)
+    for attempt in range(MAX_RETRY_ATTEMPTS):
+        wait = get_backoff_delay(camera_id, delay)
+        if stop_event is not None:
+            if stop_event.wait(wait):
+                return None
+        else:
+            time.sleep(wait)  # Задержка перед получением изображения
+
+        start = time.monotonic()
+        try:
+            response = session.get(url, timeout=(CAMERA_CONNECT_TIMEOUT, CAMERA_READ_TIMEOUT))
+            response.raise_for_status()
+            decode_start = time.monotonic()
+            observe_stage('fetch', source_name or url, decode_start - start)
+            # Декодирование прямо из буфера ответа, без промежуточных копий
+            frame = cv2.imdecode(np.frombuffer(response.content, dtype=np.uint8), cv2.IMREAD_COLOR)
+            observe_stage('decode', source_name or url, time.monotonic() - decode_start)
+            if frame is not None:
+                record_fetch_result(camera_id, time.monotonic() - start, None)
+                return frame
+            error = "не удалось декодировать изображение"
+        except Exception as e:
+            error = e
+        record_fetch_result(camera_id, time.monotonic() - start, error)
+        logging.warning(f"Ошибка при попытке {attempt + 1}/{MAX_RETRY_ATTEMPTS} получения изображения с камеры {url}: {error}")
+
+    logging.error(f"Не удалось получить изображение с камеры {url} после {MAX_RETRY_ATTEMPTS} попыток")
+    reset_camera_session(camera_id)
     return None
 
-def process_frame(frame, plate_model, symbol_model, clahe, rect_area, source_name):
-    """Обрабатывает кадр."""
-    # Применение CLAHE для улучшения контраста
-    lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-    l, a, b = cv2.split(lab)
-    cl = clahe.apply(l)
-    limg = cv2.merge((cl, a, b))
-    frame = cv2.cvtColor(limg, cv2.COLOR_LAB2BGR)
-
-    # Обрезаем область интереса
-    x0, y0, x1, y1 = rect_area
-    frame = frame[y0:y1, x0:x1]
-
-    plate_results = plate_model(frame)
-    coordinates = []
-    plate_text = ""  # Инициализация переменной plate_text
-    plate_img = None  # Инициализация переменной plate_img
-    symbols = []  # Инициализация переменной symbols
-
-    plate_detected = False
-    symbol_detected = False
+def resolve_capture_mode(url, capture_mode):
+    """Определяет режим получения кадров: опрос снимков или непрерывный поток."""
+    if capture_mode in ('snapshot', 'stream'):
+        return capture_mode
+    lower_url = url.lower()
+    if lower_url.startswith(STREAM_URL_SCHEMES) or 'mjpg' in lower_url or 'mjpeg' in lower_url:
+        return 'stream'
+    return 'snapshot'
+
+def get_stream_slot(camera_id):
+    """Возвращает слот последнего декодированного кадра потоковой камеры."""
+    with stream_lock:
+        slot = stream_slots.get(camera_id)
+        if slot is None:
+            slot = {'condition': threading.Condition(), 'version': 0, 'frame': None}
+            stream_slots[camera_id] = slot
+        return slot
+
+def remove_stream_slot(camera_id, slot):
+    """Удаляет слот потоковой камеры, если его еще не заменил перезапуск камеры с тем же id."""
+    with stream_lock:
+        if stream_slots.get(camera_id) is slot:
+            del stream_slots[camera_id]
+
+def open_stream(url):
+    """Открывает RTSP/MJPEG поток камеры с таймаутами и минимальным буфером."""
+    cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG, [
+        cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(CAMERA_CONNECT_TIMEOUT * 1000),
+        cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(CAMERA_READ_TIMEOUT * 1000)
+    ])
+    if cap.isOpened():
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+def stream_reader(camera_id, url, slot, stop_event, source_name=None):
+    """Непрерывно декодирует поток камеры в ее слот, сохраняя только самый свежий кадр."""
+    with camera_lock:
+        camera_stats.setdefault(camera_id, new_camera_stats())
 
-    for result in plate_results:
-        boxes = result.boxes
-        for box in boxes:
+    while not stop_event.is_set():
+        cap = open_stream(url)
+        if not cap.isOpened():
+            record_fetch_result(camera_id, 0.0, "не удалось открыть поток")
+        while cap.isOpened() and not stop_event.is_set():
+            start = time.monotonic()
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                record_fetch_result(camera_id, time.monotonic() - start, "поток прерван")
+                break
+            record_fetch_result(camera_id, time.monotonic() - start, None)
+            # Чтение потока включает декодирование: время учитывается как этап получения кадра
+            observe_stage('fetch', source_name or url, time.monotonic() - start)
+
+            # Устаревший кадр перезаписывается, обработчик всегда получает последний
+            with slot['condition']:
+                slot['frame'] = frame
+                slot['version'] += 1
+                slot['condition'].notify_all()
+        cap.release()
+
+        if not stop_event.is_set():
+            logging.warning(f"Поток камеры {url} недоступен. Переподключение...")
+            stop_event.wait(get_backoff_delay(camera_id, 0))
+
+def read_stream_frame(camera_id, slot, last_version, timeout):
+    """Ожидает в слоте камеры кадр новее last_version и возвращает самый свежий, отбрасывая промежуточные."""
+    with slot['condition']:
+        slot['condition'].wait_for(lambda: slot['version'] > last_version, timeout)
+        version, frame = slot['version'], slot['frame']
+    if version <= last_version or frame is None:
+        return last_version, None
+
+    dropped = version - last_version - 1
+    if dropped > 0 and last_version > 0:
+        with camera_lock:
+            if camera_id in camera_stats:
+                camera_stats[camera_id]['dropped_frames'] += dropped
+    return version, frame
+
+def submit_inference(frame, source_name=''):
+    """Ставит кадр в очередь на инференс и ожидает результат."""
+    item = {'frame': frame, 'source': source_name, 'submitted': time.monotonic(), 'event': threading.Event(), 'result': []}
+    inference_queue.put(item)
+    item['event'].wait()
+    return item['result']
+
+def collect_batch(source_queue, max_size, max_wait):
+    """Собирает батч из очереди с учетом максимального размера и времени ожидания."""
+    batch = [source_queue.get()]
+    deadline = time.monotonic() + max_wait
+    while len(batch) < max_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(source_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+def get_inference_threads():
+    """Возвращает количество потоков инференса для одной модели текущего процесса."""
+    if INFERENCE_THREADS:
+        return INFERENCE_THREADS
+    return max(1, (os.cpu_count() or 1) // max(WORKER_PROCESSES, 1))
+
+def resolve_model_backend(model_path, backend=None):
+    """Определяет бэкенд инференса по явному значению или по пути к модели."""
+    if backend:
+        return backend
+    path = model_path.rstrip('/\\')
+    if path.endswith('.onnx'):
+        return 'onnx'
+    if path.endswith('.xml') or path.endswith('_openvino_model'):
+        return 'openvino'
+    return 'torch'
+
+def letterbox_batch(images, imgsz):
+    """Приводит изображения к фиксированному размеру с сохранением пропорций и возвращает тензор NCHW и параметры масштабирования."""
+    height, width = imgsz
+    batch = np.full((len(images), height, width, 3), 114, dtype=np.uint8)
+    transforms = []
+    for index, image in enumerate(images):
+        image_height, image_width = image.shape[:2]
+        ratio = min(height / image_height, width / image_width)
+        new_width, new_height = round(image_width * ratio), round(image_height * ratio)
+        pad_x, pad_y = (width - new_width) // 2, (height - new_height) // 2
+        if (new_width, new_height) != (image_width, image_height):
+            image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+        batch[index, pad_y:pad_y + new_height, pad_x:pad_x + new_width] = image
+        transforms.append((ratio, pad_x, pad_y, image_width, image_height))
+    # BGR -> RGB, HWC -> CHW, нормализация в [0, 1]
+    tensor = np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32)
+    tensor /= 255.0
+    return tensor, transforms
+
+def decode_detections(output, transforms):
+    """Преобразует выход YOLO (батч, 4 + классы, якоря) в результаты с полями boxes.xyxy/conf/cls, как у ultralytics."""
+    results = []
+    for predictions, (ratio, pad_x, pad_y, image_width, image_height) in zip(output, transforms):
+        predictions = predictions.T
+        class_scores = predictions[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_scores)), class_ids]
+        keep = scores >= MODEL_MIN_CONFIDENCE
+        centers, scores, class_ids = predictions[keep, :4], scores[keep], class_ids[keep]
+
+        boxes = []
+        if len(scores):
+            xywh = np.column_stack((centers[:, 0] - centers[:, 2] / 2, centers[:, 1] - centers[:, 3] / 2, centers[:, 2], centers[:, 3]))
+            indices = cv2.dnn.NMSBoxesBatched(xywh.tolist(), scores.tolist(), class_ids.tolist(), MODEL_MIN_CONFIDENCE, MODEL_NMS_IOU)
+            for i in sorted(np.array(indices).flatten(), key=lambda i: -scores[i]):
+                x, y, w, h = xywh[i]
+                # Возврат координат из letterbox в систему исходного изображения
+                x1 = min(max((x - pad_x) / ratio, 0), image_width)
+                y1 = min(max((y - pad_y) / ratio, 0), image_height)
+                x2 = min(max((x + w - pad_x) / ratio, 0), image_width)
+                y2 = min(max((y + h - pad_y) / ratio, 0), image_height)
+                boxes.append(SimpleNamespace(
+                    xyxy=np.array([[x1, y1, x2, y2]], dtype=np.float32),
+                    conf=np.array([scores[i]], dtype=np.float32),
+                    cls=np.array([class_ids[i]], dtype=np.float32)
+                ))
+        results.append(SimpleNamespace(boxes=boxes))
+    return results
+
+def load_torch_model(model_path, threads):
+    """Загружает модель PyTorch через ultralytics; размер входа выбирается ultralytics по обученной модели."""
+    import torch
+    torch.set_num_threads(threads)
+    model = YOLO(model_path)
+    return lambda images: model(images, verbose=False)
+
+def load_onnx_model(model_path, imgsz, threads):
+    """Загружает экспортированную модель в ONNX Runtime на CPU с ограничением числа потоков."""
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+    model_input = session.get_inputs()[0]
+    batch_size, _, height, width = model_input.shape
+    if isinstance(height, int) and isinstance(width, int):
+        imgsz = (height, width)  # Размер, зафиксированный при экспорте
+
+    def predict(images):
+        tensor, transforms = letterbox_batch(images, imgsz)
+        if isinstance(batch_size, int):
+            # Модель экспортирована с фиксированным батчем: изображения прогоняются по одному
+            output = np.concatenate([session.run(None, {model_input.name: tensor[i:i + 1]})[0] for i in range(len(images))])
+        else:
+            output = session.run(None, {model_input.name: tensor})[0]
+        return decode_detections(output, transforms)
+    return predict
+
+def load_openvino_model(model_path, imgsz, threads):
+    """Загружает экспортированную модель в OpenVINO на CPU с ограничением числа потоков."""
+    import openvino as ov
+    if os.path.isdir(model_path):
+        model_path = glob.glob(os.path.join(model_path, '*.xml'))[0]
+    core = ov.Core()
+    model = core.read_model(model_path)
+    model_input = model.input(0).get_partial_shape()
+    if model_input[2].is_static and model_input[3].is_static:
+        imgsz = (model_input[2].get_length(), model_input[3].get_length())
+    static_batch = model_input[0].is_static
+    compiled = core.compile_model(model, 'CPU', {'INFERENCE_NUM_THREADS': threads, 'PERFORMANCE_HINT': 'LATENCY'})
+    request = compiled.create_infer_request()
+
+    def predict(images):
+        tensor, transforms = letterbox_batch(images, imgsz)
+        if static_batch:
+            output = np.concatenate([request.infer({0: tensor[i:i + 1]})[compiled.output(0)] for i in range(len(images))])
+        else:
+            output = request.infer({0: tensor})[compiled.output(0)]
+        return decode_detections(output, transforms)
+    return predict
+
+def load_model_backend(model_path, backend=None, imgsz=PLATE_MODEL_IMGSZ):
+    """Загружает модель в выбранном бэкенде и возвращает функцию инференса над списком изображений."""
+    backend = resolve_model_backend(model_path, backend)
+    threads = get_inference_threads()
+    if backend == 'torch':
+        logging.info(f"Загрузка модели {model_path} (бэкенд {backend}, потоков {threads})...")
+        return load_torch_model(model_path, threads)
+    logging.info(f"Загрузка модели {model_path} (бэкенд {backend}, вход {imgsz[1]}x{imgsz[0]}, потоков {threads})...")
+    if backend == 'onnx':
+        return load_onnx_model(model_path, imgsz, threads)
+    return load_openvino_model(model_path, imgsz, threads)
+
+def fit_symbol_crop(plate_img):
+    """Вписывает вырезку платы в SYMBOL_CROP_SIZE с сохранением пропорций и возвращает ее и масштаб координат x к исходной вырезке."""
+    if SYMBOL_CROP_SIZE is None:
+        return plate_img, 1.0
+    width, height = SYMBOL_CROP_SIZE
+    image_height, image_width = plate_img.shape[:2]
+    ratio = min(width / image_width, height / image_height)
+    new_width, new_height = max(1, round(image_width * ratio)), max(1, round(image_height * ratio))
+    # Плата прижимается к левому верхнему углу, поэтому координаты символов переводятся обратно одним масштабом
+    symbol_input = np.full((height, width, 3), 114, dtype=np.uint8)
+    symbol_input[:new_height, :new_width] = cv2.resize(plate_img, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    return symbol_input, image_width / new_width
+
+def run_inference_batch(frames, timings=None):
+    """Прогоняет батч кадров через модель плат, а найденные платы одним батчем через модель символов."""
+    plate_handle, symbol_handle = acquire_model('plate'), acquire_model('symbol')
+    try:
+        return run_models(plate_handle['predict'], symbol_handle['predict'], frames, timings)
+    finally:
+        release_model(plate_handle)
+        release_model(symbol_handle)
+
+def run_models(plate_model, symbol_model, frames, timings=None):
+    """Прогоняет батч кадров через модели плат и символов указанных версий, записывая длительность моделей в timings."""
+    start = time.monotonic()
+    plate_results = plate_model(frames)
+    if timings is not None:
+        timings['plate'] = time.monotonic() - start
+    detections = [[] for _ in frames]
+    plate_imgs = []
+    owners = []
+
+    for index, result in enumerate(plate_results):
+        for box in result.boxes:
             confidence = box.conf[0]
             if confidence < CONFIDENCE_THRESHOLD:
                 continue
 
             x1, y1, x2, y2 = map(int, box.xyxy[0])
-            plate_img = frame[y1:y2, x1:x2]
-
-            # Распознавание текста с использованием модели YOLO для символов
-            symbol_results = symbol_model(plate_img)
-            symbols = []
-            for symbol_result in symbol_results:
-                symbol_boxes = symbol_result.boxes
-                for symbol_box in symbol_boxes:
-                    symbol_confidence = symbol_box.conf[0]
-                    if symbol_confidence < CONFIDENCE_THRESHOLD:
-                        continue
-                    symbol_x1, symbol_y1, symbol_x2, symbol_y2 = map(int, symbol_box.xyxy[0])
-                    symbol_img = plate_img[symbol_y1:symbol_y2, symbol_x1:symbol_x2]
-                    symbol_label = int(symbol_box.cls[0].item())  # Извлечение индекса класса
-                    symbols.append((symbol_label, symbol_confidence, symbol_x1))
-
-            # Сортировка символов по координате x
-            symbols.sort(key=lambda x: x[2])
-            plate_text = ''.join([CLASS_TO_SYMBOL[symbol[0]] for symbol in symbols])
-
-            # Проверка формата распознанного текста
-            if is_valid_license_plate(plate_text):
-                logging.info(f"Распознанный номер с камеры {source_name}: {plate_text} (Уверенность: {confidence:.2f})")
-                coordinates.append((x1, y1, x2, y2))
-
-                plate_detected = True
-                symbol_detected = True
-            else:
-                logging.warning(f"Неверный формат номера с камеры {source_name}: {plate_text}")
+            plate_img = frames[index][y1:y2, x1:x2]
+            if plate_img.size == 0:
+                continue
+            plate_imgs.append(plate_img)
+            owners.append((index, (x1, y1, x2, y2), confidence))
+
+    if plate_imgs:
+        # Все платы кадров батча обрабатываются моделью символов единым вызовом
+        symbol_inputs, scales = zip(*(fit_symbol_crop(plate_img) for plate_img in plate_imgs))
+        start = time.monotonic()
+        symbol_results = symbol_model(list(symbol_inputs))
+        if timings is not None:
+            timings['symbol'] = time.monotonic() - start
+        for (index, coords, confidence), plate_img, scale_x, symbol_result in zip(owners, plate_imgs, scales, symbol_results):
+            detections[index].append((coords, confidence, plate_img, symbol_result, scale_x))
+
+    return detections
+
+def inference_worker():
+    """Обрабатывает очередь инференса микробатчами для всех камер."""
+    while True:
+        batch = collect_batch(inference_queue, INFERENCE_BATCH_SIZE, INFERENCE_MAX_WAIT)
+        batch_start = time.monotonic()
+        timings = {}
+        try:
+            results = run_inference_batch([item['frame'] for item in batch], timings)
+            for item, result in zip(batch, results):
+                item['result'] = result
+                # Каждая камера батча ждет весь батч, поэтому его длительность учитывается для каждой
+                observe_stage('queue', item['source'], batch_start - item['submitted'])
+                for stage, seconds in timings.items():
+                    observe_stage(stage, item['source'], seconds)
+        except Exception as e:
+            logging.error(f"Ошибка инференса батча из {len(batch)} кадров: {e}")
+        finally:
+            for item in batch:
+                item['event'].set()
+
+def enhance_frame(frame, clahe, enhance_mode):
+    """Улучшает контраст кадра с помощью CLAHE в выбранном режиме."""
+    if enhance_mode == 'none':
+        return frame
+    if enhance_mode == 'luma':
+        # CLAHE по каналу Y в YCrCb: цветность сохраняется, преобразование дешевле перевода в LAB и обратно
+        ycrcb = cv2.cvtColor(frame, cv2.COLOR_BGR2YCrCb)
+        cv2.insertChannel(clahe.apply(cv2.extractChannel(ycrcb, 0)), ycrcb, 0)
+        return cv2.cvtColor(ycrcb, cv2.COLOR_YCrCb2BGR, dst=ycrcb)
+    # CLAHE по каналу L на месте: без разделения и сборки всех каналов
+    lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+    cv2.insertChannel(clahe.apply(cv2.extractChannel(lab, 0)), lab, 0)
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=lab)
+
+def detect_motion(frame, rect_area, reference, threshold):
+    """Сравнивает уменьшенную ROI с опорным кадром и возвращает признак изменения сцены и уменьшенный кадр."""
+    x0, y0, x1, y1 = rect_area
+    roi = frame[y0:y1, x0:x1]
+    height, width = roi.shape[:2]
+    small_height = max(1, height * MOTION_FRAME_WIDTH // max(width, 1))
+    small = cv2.resize(roi, (MOTION_FRAME_WIDTH, small_height), interpolation=cv2.INTER_AREA)
+    small = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+    if reference is None or reference.shape != small.shape:
+        return True, small
+
+    diff = cv2.absdiff(small, reference)
+    _, changed = cv2.threshold(diff, MOTION_PIXEL_DELTA, 255, cv2.THRESH_BINARY)
+    return cv2.countNonZero(changed) / changed.size >= threshold, small
+
+def decode_plate_symbols(symbol_result, scale_x):
+    """Возвращает символы платы [(класс, уверенность, x1)] слева направо и составленный из них текст."""
+    # Символы платы, координаты приводятся к размеру исходной вырезки
+    symbols = []
+    for symbol_box in symbol_result.boxes:
+        symbol_confidence = symbol_box.conf[0]
+        if symbol_confidence < CONFIDENCE_THRESHOLD:
+            continue
+        symbol_x1 = int(float(symbol_box.xyxy[0][0]) * scale_x)
+        symbol_label = int(symbol_box.cls[0].item())  # Извлечение индекса класса
+        symbols.append((symbol_label, symbol_confidence, symbol_x1))
+
+    # Сортировка символов по координате x
+    symbols.sort(key=lambda x: x[2])
+    plate_text = ''.join([CLASS_TO_SYMBOL[symbol[0]] for symbol in symbols])
+    return symbols, plate_text
+
+def process_frame(frame, clahe, rect_area, source_name, enhance_mode='full'):
+    """Обрабатывает кадр и возвращает ROI и список распознанных номеров."""
+    # Обрезаем область интереса до улучшения контраста, чтобы не обрабатывать отбрасываемые пиксели
+    x0, y0, x1, y1 = rect_area
+    frame = frame[y0:y1, x0:x1]
 
-    update_metrics('plate', plate_detected)
-    update_metrics('symbol', symbol_detected)
+    # Применение CLAHE для улучшения контраста
+    start = time.monotonic()
+    frame = enhance_frame(frame, clahe, enhance_mode)
+    observe_stage('clahe', source_name, time.monotonic() - start)
+
+    plates = []
+    for coordinates, confidence, plate_img, symbol_result, scale_x in submit_inference(frame, source_name):
+        symbols, plate_text = decode_plate_symbols(symbol_result, scale_x)
+
+        # Проверка формата распознанного текста
+        if is_valid_license_plate(plate_text):
+            logging.info(f"Распознанный номер с камеры {source_name}: {plate_text} (Уверенность: {confidence:.2f})")
+            plates.append({
+                'coordinates': coordinates,
+                'plate_text': plate_text,
+                'plate_img': plate_img,
+                'symbols': symbols,
+                'confidence': float(confidence)
+            })
+        else:
+            logging.warning(f"Неверный формат номера с камеры {source_name}: {plate_text}")
+
+    update_metrics('plate', bool(plates))
+    update_metrics('symbol', bool(plates))
+
+    return frame, plates
+
+def get_frame_slot(camera_id):
+    """Возвращает слот последнего кадра камеры, создавая его при необходимости, или None, если камера удалена."""
+    with frame_bus_lock:
+        slot = frame_bus.get(camera_id)
+        if slot is None:
+            # Проверка под блокировкой: камера удаляется из rect_cam до удаления слота, поэтому
+            # кадр, обработанный после остановки камеры, не создает слот заново
+            if camera_id not in rect_cam:
+                return None
+            slot = {
+                'condition': threading.Condition(),
+                'encode_lock': threading.Lock(),
+                'version': 0,
+                'frame': None,
+                'coordinates': [],
+                'plate_text': '',
+                'ring_ref': None,
+                'jpeg': None,
+                'jpeg_version': 0
+            }
+            frame_bus[camera_id] = slot
+        return slot
+
+def remove_frame_slot(camera_id):
+    """Удаляет слот камеры и будит ожидающих зрителей."""
+    with frame_bus_lock:
+        slot = frame_bus.pop(camera_id, None)
+    if slot is not None:
+        with slot['condition']:
+            slot['condition'].notify_all()
+
+def create_frame_ring(name=None):
+    """Создает кольцевой буфер кадров в разделяемой памяти или подключается к существующему по имени."""
+    slot_bytes = FRAME_RING_HEADER_SIZE + FRAME_RING_SLOT_SIZE
+    if name is None:
+        shm = shared_memory.SharedMemory(create=True, size=FRAME_RING_SLOTS * slot_bytes)
+    else:
+        shm = shared_memory.SharedMemory(name=name)
+    headers, data = [], []
+    for index in range(FRAME_RING_SLOTS):
+        offset = index * slot_bytes
+        headers.append(np.ndarray((4,), dtype=np.uint64, buffer=shm.buf, offset=offset))
+        data.append(np.ndarray((FRAME_RING_SLOT_SIZE,), dtype=np.uint8, buffer=shm.buf, offset=offset + FRAME_RING_HEADER_SIZE))
+    return {'shm': shm, 'headers': headers, 'data': data, 'next': 0, 'lock': threading.Lock()}
+
+def write_ring_frame(ring, frame):
+    """Копирует кадр в следующий слот буфера и возвращает (слот, счетчик записи) или None, если кадр не помещается."""
+    if frame.ndim != 3 or frame.nbytes > FRAME_RING_SLOT_SIZE:
+        return None
+    with ring['lock']:
+        index = ring['next']
+        ring['next'] = (index + 1) % FRAME_RING_SLOTS
+        header = ring['headers'][index]
+        sequence = int(header[0]) + 1
+        header[0] = sequence  # Нечетный счетчик: слот перезаписывается
+        header[1:4] = frame.shape
+        np.copyto(ring['data'][index][:frame.nbytes].reshape(frame.shape), frame)
+        header[0] = sequence + 1
+    return index, sequence + 1
+
+def read_ring_frame(ring, index, sequence):
+    """Возвращает кадр из слота буфера без копирования или None, если слот уже перезаписан."""
+    header = ring['headers'][index]
+    if int(header[0]) != sequence:
+        return None
+    height, width, channels = (int(value) for value in header[1:4])
+    return ring['data'][index][:height * width * channels].reshape(height, width, channels)
+
+def is_ring_frame_valid(ring_ref):
+    """Проверяет, что слот буфера не был перезаписан после чтения кадра."""
+    ring, index, sequence = ring_ref
+    return int(ring['headers'][index][0]) == sequence
+
+def record_ring_fallback(camera_id, frame):
+    """Учитывает кадр, не поместившийся в слот буфера, и один раз на камеру предупреждает об этом в логе."""
+    with frame_ring_metrics_lock:
+        frame_ring_metrics['queue_frames'] += 1
+        first = camera_id not in frame_ring_oversized
+        frame_ring_oversized.add(camera_id)
+    if first:
+        logging.warning(f"Кадр камеры {camera_id} ({frame.nbytes} байт) больше слота буфера разделяемой памяти ({FRAME_RING_SLOT_SIZE} байт), "
+                        f"кадры передаются через очередь. Увеличьте FRAME_RING_SLOT_SIZE.")
+
+def publish_frame(camera_id, frame, coordinates, plate_text, ring_ref=None):
+    """Публикует последний обработанный кадр камеры и результаты детекции."""
+    if worker_events is not None:
+        # В процессе обработки зрителей нет: кадр камеры, которую смотрят, передается процессу веб-сервера
+        # через разделяемую память, а при нехватке места в слоте - через очередь
+        if camera_id not in viewed_cameras:
+            return
+        position = write_ring_frame(frame_ring, frame) if frame_ring is not None else None
+        if position is None:
+            record_ring_fallback(camera_id, frame)
+            send_worker_event(('frame', camera_id, frame, coordinates, plate_text))
+        else:
+            with frame_ring_metrics_lock:
+                frame_ring_metrics['ring_frames'] += 1
+            send_worker_event(('ring_frame', camera_id, worker_index, *position, coordinates, plate_text))
+        return
+    slot = get_frame_slot(camera_id)
+    if slot is None:
+        return  # Камера удалена, пока обрабатывался ее последний кадр
+    with slot['condition']:
+        slot['frame'] = frame
+        slot['ring_ref'] = ring_ref
+        slot['coordinates'] = coordinates
+        slot['plate_text'] = plate_text
+        slot['version'] += 1
+        slot['condition'].notify_all()
+
+def read_frame_jpeg(camera_id, last_version, timeout):
+    """Ожидает новый кадр камеры и возвращает его в JPEG, кодируя каждый кадр один раз для всех зрителей."""
+    slot = get_frame_slot(camera_id)
+    if slot is None:
+        return last_version, None
+    with slot['condition']:
+        slot['condition'].wait_for(lambda: slot['version'] > last_version, timeout)
+        version = slot['version']
+        if version <= last_version or slot['frame'] is None:
+            return last_version, None
+        if slot['jpeg_version'] == version:
+            return version, slot['jpeg']
+        frame, coordinates, ring_ref = slot['frame'], slot['coordinates'], slot['ring_ref']
+
+    with slot['encode_lock']:
+        if slot['jpeg_version'] != version:
+            # Рисование рамки на копии изображения, исходный кадр используется для датасета
+            frame = frame.copy()
+            if ring_ref is not None and not is_ring_frame_valid(ring_ref):
+                return version, None  # Слот разделяемой памяти перезаписан во время копирования
+            for x1, y1, x2, y2 in coordinates:
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
 
-    return frame, coordinates, plate_text, plate_img, symbols
+            ret, buffer = cv2.imencode('.jpg', frame)
+            if not ret:
+                return version, None
+            slot['jpeg'] = buffer.tobytes()
+            slot['jpeg_version'] = version
+        return version, slot['jpeg']
 
 def is_valid_license_plate(plate_text):
     """Проверяет, соответствует ли распознанный текст формату российского номерного знака."""
@@ -207,78 +1135,142 @@ def is_valid_license_plate(plate_text):
     return True
 
 def save_image_and_data(frame, coordinates, plate_text, plate_img, symbols, save_dir, source_name):
-    """Сохраняет изображения и данные для датасета."""
+    """Ставит изображения и данные для датасета в очередь фоновой записи."""
     timestamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
-    car_image_filename = f"{timestamp}_{plate_text}.jpg"
+    car_image_filename = f"{timestamp}_{plate_text}.{DATASET_IMAGE_FORMAT}"
     car_txt_filename = f"{timestamp}_{plate_text}.txt"
-    plate_image_filename = f"{timestamp}_{plate_text}_plate.jpg"
+    plate_image_filename = f"{timestamp}_{plate_text}_plate.{DATASET_IMAGE_FORMAT}"
     plate_txt_filename = f"{timestamp}_{plate_text}_plate.txt"
     car_image_path = os.path.join(save_dir, "cars", car_image_filename)
     car_txt_path = os.path.join(save_dir, "cars", car_txt_filename)
     plate_image_path = os.path.join(save_dir, "plate", plate_image_filename)
     plate_txt_path = os.path.join(save_dir, "plate", plate_txt_filename)
 
-    # Проверка наличия номера в базе данных
-    if search_plate_in_db(plate_text, source_name):
-        logging.info(f"Номер {plate_text} с камеры {source_name} уже существует в базе данных. Обновление match_count и time_in_view.")
-        return car_image_filename, plate_image_filename
-
-    # Сохранение исходной картинки без выделения номера
-    cv2.imwrite(car_image_path, frame)
+    job = {
+        'source_name': source_name,
+        'car_image_path': car_image_path,
+        'frame': frame,
+        'car_txt_path': None,
+        'car_labels': [],
+        'plate_image_path': plate_image_path,
+        'plate_img': plate_img,
+        'plate_txt_path': None,
+        'plate_labels': []
+    }
 
     if SAVE_DATASET:
-        # Сохранение координат обнаруженной платы
+        # Координаты обнаруженной платы
         height, width, _ = frame.shape
-        with open(car_txt_path, 'w') as f:
-            for x1, y1, x2, y2 in coordinates:
-                x_center = (x1 + x2) / (2 * width)
-                y_center = (y1 + y2) / (2 * height)
-                bbox_width = (x2 - x1) / width
-                bbox_height = (y2 - y1) / height
-                f.write(f"0 {x_center} {y_center} {bbox_width} {bbox_height}\n")
+        job['car_txt_path'] = car_txt_path
+        for x1, y1, x2, y2 in coordinates:
+            x_center = (x1 + x2) / (2 * width)
+            y_center = (y1 + y2) / (2 * height)
+            bbox_width = (x2 - x1) / width
+            bbox_height = (y2 - y1) / height
+            job['car_labels'].append(f"0 {x_center} {y_center} {bbox_width} {bbox_height}\n")
+
+    if plate_img is not None and SAVE_DATASET:
+        # Координаты обнаруженных символов
+        plate_height, plate_width, _ = plate_img.shape
+        job['plate_txt_path'] = plate_txt_path
+        for symbol in symbols:
+            symbol_label, _, symbol_x1 = symbol
+            symbol_x2 = symbol_x1 + plate_width // len(symbols)
+            symbol_y1 = 0
+            symbol_y2 = plate_height
+            x_center = (symbol_x1 + symbol_x2) / (2 * plate_width)
+            y_center = (symbol_y1 + symbol_y2) / (2 * plate_height)
+            bbox_width = (symbol_x2 - symbol_x1) / plate_width
+            bbox_height = (symbol_y2 - symbol_y1) / plate_height
+            job['plate_labels'].append(f"{symbol_label} {x_center} {y_center} {bbox_width} {bbox_height}\n")
+
+    enqueue_dataset_write(job)
+    return car_image_filename, plate_image_filename
+
+def enqueue_dataset_write(job):
+    """Ставит набор файлов в очередь записи с учетом политики переполнения."""
+    try:
+        if DATASET_QUEUE_POLICY == 'block':
+            dataset_queue.put(job, timeout=DATASET_QUEUE_BLOCK_TIMEOUT)
+        else:
+            dataset_queue.put_nowait(job)
+    except queue.Full:
+        with dataset_metrics_lock:
+            dataset_metrics['dropped'] += 1
+        logging.warning(f"Очередь записи датасета переполнена, изображение с камеры {job['source_name']} не сохранено: {job['car_image_path']}")
+        return False
+
+    with dataset_metrics_lock:
+        dataset_metrics['queued'] += 1
+    return True
+
+def get_image_write_params():
+    """Возвращает параметры кодирования изображений датасета."""
+    if DATASET_IMAGE_FORMAT == 'jpg':
+        return [cv2.IMWRITE_JPEG_QUALITY, DATASET_JPEG_QUALITY]
+    if DATASET_IMAGE_FORMAT == 'webp':
+        return [cv2.IMWRITE_WEBP_QUALITY, DATASET_JPEG_QUALITY]
+    return []
+
+def write_dataset_job(job):
+    """Записывает изображения и файлы разметки одного распознавания."""
+    params = get_image_write_params()
+    source_name = job['source_name']
+
+    # Сохранение исходной картинки без выделения номера
+    cv2.imwrite(job['car_image_path'], job['frame'], params)
+    logging.info(f"Сохранено изображение с камеры {source_name}: {job['car_image_path']}")
+
+    if job['car_txt_path']:
+        with open(job['car_txt_path'], 'w') as f:
+            f.writelines(job['car_labels'])
+        logging.info(f"Сохранены координаты с камеры {source_name}: {job['car_txt_path']}")
 
-    if plate_img is not None:
+    if job['plate_img'] is not None:
         # Сохранение изображения платы без выделения символов
-        cv2.imwrite(plate_image_path, plate_img)
-
-        if SAVE_DATASET:
-            # Сохранение координат обнаруженных символов
-            plate_height, plate_width, _ = plate_img.shape
-            with open(plate_txt_path, 'w') as f:
-                for symbol in symbols:
-                    symbol_label, _, symbol_x1 = symbol
-                    symbol_x2 = symbol_x1 + plate_width // len(symbols)
-                    symbol_y1 = 0
-                    symbol_y2 = plate_height
-                    x_center = (symbol_x1 + symbol_x2) / (2 * plate_width)
-                    y_center = (symbol_y1 + symbol_y2) / (2 * plate_height)
-                    bbox_width = (symbol_x2 - symbol_x1) / plate_width
-                    bbox_height = (symbol_y2 - symbol_y1) / plate_height
-                    f.write(f"{symbol_label} {x_center} {y_center} {bbox_width} {bbox_height}\n")
-
-    logging.info(f"Сохранено изображение с камеры {source_name}: {car_image_path}")
-    if SAVE_DATASET:
-        logging.info(f"Сохранены координаты с камеры {source_name}: {car_txt_path}")
-    if plate_img is not None:
-        logging.info(f"Сохранено изображение платы с камеры {source_name}: {plate_image_path}")
-        if SAVE_DATASET:
-            logging.info(f"Сохранены координаты символов с камеры {source_name}: {plate_txt_path}")
-    return car_image_filename, plate_image_filename
+        cv2.imwrite(job['plate_image_path'], job['plate_img'], params)
+        logging.info(f"Сохранено изображение платы с камеры {source_name}: {job['plate_image_path']}")
 
-def save_to_sqlite(data):
-    """Сохраняет данные в SQLite."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+        if job['plate_txt_path']:
+            with open(job['plate_txt_path'], 'w') as f:
+                f.writelines(job['plate_labels'])
+            logging.info(f"Сохранены координаты символов с камеры {source_name}: {job['plate_txt_path']}")
+
+def dataset_writer():
+    """Фоновый поток записи датасета на диск."""
+    while True:
+        job = dataset_queue.get()
+        start = time.monotonic()
+        try:
+            write_dataset_job(job)
+            error = False
+        except Exception as e:
+            logging.error(f"Ошибка записи датасета с камеры {job['source_name']}: {e}")
+            error = True
+        finally:
+            dataset_queue.task_done()
+
+        write_ms = (time.monotonic() - start) * 1000
+        observe_stage('disk', job['source_name'], write_ms / 1000)
+        with dataset_metrics_lock:
+            if error:
+                dataset_metrics['errors'] += 1
+            else:
+                dataset_metrics['written'] += 1
+                dataset_metrics['last_write_ms'] = write_ms
+                dataset_metrics['avg_write_ms'] += (write_ms - dataset_metrics['avg_write_ms']) / dataset_metrics['written']
 
+def save_to_sqlite(data):
+    """Сохраняет данные в SQLite и возвращает идентификатор записи."""
     try:
-        cursor.execute("""
+        record_id, _ = db_write("""
             INSERT INTO record (
                 datetime, key, x0, y0, x1, y1, ratio,
                 photo_plate, photo_care, source, detect_count,
                 detect_sec, no_detect_sec, send_to_server_code,
-                match_count, time_in_view
+                match_count, time_in_view, time
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             data[0],  # datetime
             data[1],  # key
@@ -295,158 +1287,610 @@ def save_to_sqlite(data):
             float(data[12]),  # no_detect_sec
             int(data[13]),  # send_to_server_code
             int(data[14]),  # match_count
-            float(data[15])  # time_in_view
-        ))
-        conn.commit()
-    except sqlite3.InterfaceError as e:
-        logging.error(f"Ошибка записи в SQLite: {e}")
-        logging.error(f"Данные: {data}")
-    finally:
-        conn.close()
-
-def update_record_in_db(record_id, match_count, time_in_view):
-    """Обновляет запись в базе данных."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            UPDATE record SET match_count = ?, time_in_view = ? WHERE id = ?
-        """, (match_count, time_in_view, record_id))
-        conn.commit()
-    except sqlite3.InterfaceError as e:
-        logging.error(f"Ошибка обновления записи в базе данных: {e}")
-    finally:
-        conn.close()
-
-def search_plate_in_db(plate_text, source_name):
-    """Ищет номер в базе данных и обновляет match_count и time_in_view."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+            float(data[15]),  # time_in_view
+            int(data[16])  # time
+        ), wait=True)
+        return record_id
+    except sqlite3.Error:
+        return None  # Ошибка уже записана в лог потоком записи
+
+def update_records_in_db(updates):
+    """Обновляет match_count и time_in_view пачки записей одной транзакцией."""
+    db_write("""
+        UPDATE record SET match_count = ?, time_in_view = ? WHERE id = ?
+    """, updates, many=True)
+
+def warm_plate_cache():
+    """Загружает в кэш номера, сохраненные в пределах окна поиска."""
+    search_time = int(datetime.now(timezone.utc).timestamp() - SEARCH_TIME_WINDOW)
+    rows = db_read("""
+        SELECT id, key, source, time, match_count, time_in_view FROM record
+        WHERE time >= ? ORDER BY time
+    """, (search_time,))
+    with plate_cache_lock:
+        for record_id, plate_text, source_name, record_time, match_count, time_in_view in rows:
+            plate_cache[(plate_text, source_name)] = {
+                'record_id': record_id,
+                'time': record_time,
+                'match_count': match_count or 0,
+                'time_in_view': time_in_view or 0.0,
+                'dirty': False
+            }
+    logging.info(f"В кэш недавних номеров загружено {len(rows)} записей")
+
+def search_recent_plate(plate_text, source_name):
+    """Проверяет по кэшу, сохранялся ли номер с камеры в пределах окна поиска, и накапливает match_count и time_in_view."""
+    current_time = datetime.now(timezone.utc).timestamp()
+    with plate_cache_lock:
+        entry = plate_cache.get((plate_text, source_name))
+        if entry is None or current_time - entry['time'] > SEARCH_TIME_WINDOW:
+            return False
+        entry['match_count'] += 1
+        entry['time_in_view'] = current_time - entry['time']
+        entry['dirty'] = True
+        return True
+
+def remember_plate(plate_text, source_name, record_id, record_time):
+    """Добавляет сохраненную запись в кэш недавних номеров."""
+    with plate_cache_lock:
+        previous = plate_cache.get((plate_text, source_name))
+        if previous is not None and previous['dirty']:
+            # Счетчики прежней записи с последнего сброса уходят в базу при следующем сбросе
+            plate_cache_pending.append((previous['match_count'], previous['time_in_view'], previous['record_id']))
+        plate_cache[(plate_text, source_name)] = {
+            'record_id': record_id,
+            'time': record_time,
+            'match_count': 1,
+            'time_in_view': 0.0,
+            'dirty': False
+        }
 
+def flush_plate_cache():
+    """Записывает накопленные счетчики в базу и удаляет из кэша номера за пределами окна поиска."""
+    current_time = datetime.now(timezone.utc).timestamp()
+    with plate_cache_lock:
+        updates = plate_cache_pending[:]
+        plate_cache_pending.clear()
+        for key, entry in list(plate_cache.items()):
+            if entry['dirty']:
+                updates.append((entry['match_count'], entry['time_in_view'], entry['record_id']))
+                entry['dirty'] = False
+            if current_time - entry['time'] > SEARCH_TIME_WINDOW:
+                del plate_cache[key]
+    if updates:
+        update_records_in_db(updates)
+    return len(updates)
+
+def plate_cache_flusher():
+    """Периодически сбрасывает счетчики кэша недавних номеров в базу."""
+    while True:
+        time.sleep(PLATE_CACHE_FLUSH_INTERVAL)
+        try:
+            flush_plate_cache()
+        except Exception as e:
+            logging.error(f"Ошибка записи счетчиков кэша номеров: {e}")
+
+def is_permanent_rejection(status_code):
+    """Проверяет, отклонил ли сервер записи окончательно: повтор того же запроса не поможет."""
+    return 400 <= status_code < 500 and status_code not in (408, 425, 429)
+
+def post_outbox_batch(session, records):
+    """Отправляет пачку записей на OUTBOX_URL; возвращает код ответа (None без ответа) и текст ошибки."""
     try:
-        current_time = datetime.now(timezone.utc).timestamp()
-        search_time = current_time - SEARCH_TIME_WINDOW
-        cursor.execute("""
-            SELECT id, match_count, datetime FROM record
-            WHERE key = ? AND source = ? AND datetime >= ?
-        """, (plate_text, source_name, datetime.fromtimestamp(search_time, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")))
-
-        result = cursor.fetchone()
-        if result:
-            record_id, match_count, last_detect_time_str = result
-            last_detect_time = datetime.strptime(last_detect_time_str, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
-            time_in_view = current_time - last_detect_time
-            match_count += 1
-            update_record_in_db(record_id, match_count, time_in_view)
-            return True
-        return False
-    except sqlite3.InterfaceError as e:
-        logging.error(f"Ошибка поиска в базе данных: {e}")
-    finally:
-        conn.close()
+        response = session.post(OUTBOX_URL, json={'records': records}, timeout=(OUTBOX_CONNECT_TIMEOUT, OUTBOX_READ_TIMEOUT))
+    except requests.RequestException as e:
+        return None, str(e)
+    if response.ok:
+        return response.status_code, None
+    return response.status_code, f"HTTP {response.status_code}: {response.text[:200]}"
+
+def complete_outbox_records(records, status_code):
+    """Сохраняет код результата доставки записей; записи с кодом, отличным от 0, больше не отправляются."""
+    now = int(time.time())
+    db_write("UPDATE record SET send_to_server_code = ?, send_attempts = COALESCE(send_attempts, 0) + 1, send_time = ? WHERE id = ?",
+             [(status_code, now, record['id']) for record in records], wait=True, many=True)
+
+def record_outbox_result(records, status_code, error, latency):
+    """Обновляет метрики доставки по результату запроса."""
+    now = time.time()
+    latency_ms = latency * 1000
+    with outbox_metrics_lock:
+        outbox_metrics['batches'] += 1
+        outbox_metrics['last_status'] = status_code
+        outbox_metrics['last_batch_ms'] = latency_ms
+        outbox_metrics['avg_batch_ms'] += (latency_ms - outbox_metrics['avg_batch_ms']) / outbox_metrics['batches']
+        if error is None:
+            outbox_metrics['delivered'] += len(records)
+            outbox_metrics['consecutive_failures'] = 0
+            outbox_metrics['last_delivery_lag_sec'] = max(0.0, now - min(record['time'] or now for record in records))
+            outbox_deliveries.append((now, len(records)))
+        else:
+            outbox_metrics['last_error'] = error
+            if status_code is None or not is_permanent_rejection(status_code):
+                outbox_metrics['failures'] += 1
+                outbox_metrics['consecutive_failures'] += 1
+
+def deliver_outbox_batch(session, records):
+    """Доставляет пачку записей и сохраняет результат; возвращает False, если доставку нужно повторить позже."""
+    start = time.monotonic()
+    status_code, error = post_outbox_batch(session, records)
+    record_outbox_result(records, status_code, error, time.monotonic() - start)
+    if error is None:
+        complete_outbox_records(records, status_code)
+        return True
+    if status_code is not None and is_permanent_rejection(status_code):
+        if len(records) > 1:
+            # Пачка отклонена целиком: делится пополам, пока неверные записи не окажутся в отдельных запросах
+            middle = len(records) // 2
+            return deliver_outbox_batch(session, records[:middle]) and deliver_outbox_batch(session, records[middle:])
+        logging.error(f"Вышестоящий сервер отклонил запись {records[0]['id']}: {error}")
+        complete_outbox_records(records, status_code)
+        with outbox_metrics_lock:
+            outbox_metrics['rejected'] += 1
+        return True
+    db_write("UPDATE record SET send_attempts = COALESCE(send_attempts, 0) + 1 WHERE id = ?",
+             [(record['id'],) for record in records], wait=True, many=True)
+    logging.warning(f"Ошибка доставки {len(records)} записей на {OUTBOX_URL}: {error}")
+    return False
+
+def get_outbox_start_id():
+    """Возвращает id последней записи, сохраненной до миграции 4: записи до него включительно не отправляются."""
+    global outbox_start_id
+    if outbox_start_id is None:
+        rows = db_read("SELECT start_id FROM outbox_state WHERE id = 1")
+        outbox_start_id = rows[0][0] if rows else 0
+    return outbox_start_id
+
+def outbox_sender():
+    """Доставляет неотправленные записи (send_to_server_code = 0 после границы прежних записей) пачками через постоянное соединение с повторами после ошибок."""
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+    session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+    failures = 0
+    while True:
+        try:
+            # Очередь доставки - сама таблица record, поэтому неотправленные записи переживают перезапуск
+            rows = db_read(f"SELECT {', '.join(OUTBOX_COLUMNS)} FROM record WHERE send_to_server_code = 0 AND id > ? ORDER BY id LIMIT ?",
+                           (get_outbox_start_id(), OUTBOX_BATCH_SIZE))
+            if not rows:
+                time.sleep(OUTBOX_POLL_INTERVAL)
+                continue
+            delivered = deliver_outbox_batch(session, [dict(zip(OUTBOX_COLUMNS, row)) for row in rows])
+        except sqlite3.Error as e:
+            # Занятая или недоступная база не останавливает доставку: повтор после задержки
+            logging.error(f"Ошибка чтения или сохранения записей доставки: {e}")
+            with outbox_metrics_lock:
+                outbox_metrics['failures'] += 1
+                outbox_metrics['consecutive_failures'] += 1
+                outbox_metrics['last_error'] = f"SQLite: {e}"
+            delivered = False
+        if delivered:
+            failures = 0
+        else:
+            failures += 1
+            time.sleep(min(OUTBOX_BACKOFF_BASE * 2 ** (failures - 1), OUTBOX_BACKOFF_MAX))
+
+def outbox_metrics_snapshot():
+    """Возвращает метрики доставки записей: счетчики, скорость за окно и отставание по старейшей неотправленной записи."""
+    now = time.time()
+    with outbox_metrics_lock:
+        while outbox_deliveries and outbox_deliveries[0][0] < now - OUTBOX_THROUGHPUT_WINDOW:
+            outbox_deliveries.popleft()
+        metrics = dict(outbox_metrics)
+        metrics['records_per_sec'] = sum(count for _, count in outbox_deliveries) / OUTBOX_THROUGHPUT_WINDOW
+    metrics['enabled'] = OUTBOX_URL is not None
+    start_id = get_outbox_start_id()
+    metrics['pending'] = db_read("SELECT COUNT(*) FROM record WHERE send_to_server_code = 0 AND id > ?", (start_id,))[0][0]
+    oldest = db_read("SELECT time FROM record WHERE send_to_server_code = 0 AND id > ? ORDER BY id LIMIT 1", (start_id,))
+    metrics['lag_sec'] = max(0.0, now - oldest[0][0]) if oldest and oldest[0][0] is not None else 0.0
+    return metrics
 
 def fetch_cameras_from_db():
     """Извлекает данные камер из базы данных."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT url, x0, y0, x1, y1, name FROM cameras")
-    cameras = cursor.fetchall()
-    conn.close()
-    return cameras
-
-def capture_frame(url, plate_model, symbol_model, clahe, rect_area, source_name, detection_state, stop_event):
+    return db_read("SELECT id, url, x0, y0, x1, y1, name, capture_mode, enhance_mode, motion_threshold FROM cameras")
+
+def get_cpu_load():
+    """Возвращает загрузку CPU процессом как долю от всех ядер, обновляя замер раз в окно."""
+    with cpu_monitor_lock:
+        now = time.monotonic()
+        elapsed = now - cpu_monitor['wall']
+        if elapsed >= CPU_LOAD_WINDOW:
+            cpu = time.process_time()
+            cpu_monitor['load'] = (cpu - cpu_monitor['cpu']) / elapsed / (os.cpu_count() or 1)
+            cpu_monitor['wall'], cpu_monitor['cpu'] = now, cpu
+        return cpu_monitor['load']
+
+def get_processing_delay(detection_state, elapsed, tracking):
+    """Возвращает паузу до следующего кадра с учетом активности камеры, времени обработки и бюджета CPU."""
+    if tracking:
+        # Номер еще не установлен: кадры нужны чаще
+        interval = ACTIVE_PROCESSING_INTERVAL
+    elif detection_state['detect_count'] == 0 and detection_state['no_detect_sec'] >= IDLE_AFTER_SEC:
+        interval = IDLE_PROCESSING_INTERVAL
+    else:
+        interval = PROCESSING_INTERVAL
+
+    # При превышении бюджета CPU все камеры замедляются пропорционально перегрузке;
+    # процессы обработки делят общий бюджет поровну
+    budget = CPU_BUDGET / max(WORKER_PROCESSES, 1)
+    load = get_cpu_load()
+    if load > budget:
+        interval *= load / budget
+    return max(FETCH_IMAGE_DELAY, interval - elapsed)
+
+def box_iou(box_a, box_b):
+    """Возвращает отношение площади пересечения рамок к площади их объединения."""
+    x1, y1 = max(box_a[0], box_b[0]), max(box_a[1], box_b[1])
+    x2, y2 = min(box_a[2], box_b[2]), min(box_a[3], box_b[3])
+    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+def box_centroid_distance(box_a, box_b):
+    """Возвращает расстояние между центрами рамок в ширинах первой рамки."""
+    dx = (box_a[0] + box_a[2] - box_b[0] - box_b[2]) / 2
+    dy = (box_a[1] + box_a[3] - box_b[1] - box_b[3]) / 2
+    return (dx * dx + dy * dy) ** 0.5 / max(box_a[2] - box_a[0], 1)
+
+def match_tracks(tracks, plates):
+    """Сопоставляет номера кадра с треками: сначала по IoU, затем по смещению центра."""
+    pairs = []
+    free_tracks = list(tracks)
+    free_plates = list(plates)
+
+    candidates = sorted(
+        ((box_iou(track['box'], plate['coordinates']), track, plate) for track in free_tracks for plate in free_plates),
+        key=lambda candidate: candidate[0], reverse=True
+    )
+    for iou, track, plate in candidates:
+        if iou < TRACK_IOU_THRESHOLD:
+            break
+        if track in free_tracks and plate in free_plates:
+            pairs.append((track, plate))
+            free_tracks.remove(track)
+            free_plates.remove(plate)
+
+    candidates = sorted(
+        ((box_centroid_distance(track['box'], plate['coordinates']), track, plate) for track in free_tracks for plate in free_plates),
+        key=lambda candidate: candidate[0]
+    )
+    for distance, track, plate in candidates:
+        if distance > TRACK_CENTROID_DISTANCE:
+            break
+        if track in free_tracks and plate in free_plates:
+            pairs.append((track, plate))
+            free_tracks.remove(track)
+            free_plates.remove(plate)
+
+    return pairs, free_plates
+
+def get_track_consensus(track):
+    """Возвращает номер трека по голосам символов и минимальную долю голосов среди позиций."""
+    if not track['votes']:
+        return "", 0.0
+    # Длина номера (8 или 9 символов) выбирается по суммарному весу голосов
+    positions = max(track['votes'].values(), key=lambda votes: sum(sum(position.values()) for position in votes))
+    plate_text = ""
+    agreement = 1.0
+    for position in positions:
+        symbol, weight = max(position.items(), key=lambda item: item[1])
+        plate_text += symbol
+        agreement = min(agreement, weight / sum(position.values()))
+    return plate_text, agreement
+
+def update_track(track, plate, frame, coordinates, now):
+    """Добавляет наблюдение номера в трек и голоса уверенности по каждому символу."""
+    track['box'] = plate['coordinates']
+    track['last_seen'] = now
+    track['hits'] += 1
+
+    symbols = plate['symbols']
+    positions = track['votes'].setdefault(len(symbols), [{} for _ in symbols])
+    for position, (symbol_label, symbol_confidence, _) in zip(positions, symbols):
+        symbol = CLASS_TO_SYMBOL[symbol_label]
+        position[symbol] = position.get(symbol, 0.0) + float(symbol_confidence)
+
+    # Для сохранения запоминается лучший кадр по каждому варианту номера
+    score = plate['confidence'] * sum(float(symbol[1]) for symbol in symbols) / max(len(symbols), 1)
+    best = track['best'].get(plate['plate_text'])
+    if best is None or score > best['score']:
+        track['best'][plate['plate_text']] = {'score': score, 'frame': frame, 'coordinates': coordinates, 'plate': plate}
+
+def update_tracker(tracker, frame, plates, now):
+    """Обновляет треки номеров камеры и возвращает треки, номер которых пора сохранить."""
+    coordinates = [plate['coordinates'] for plate in plates]
+    pairs, new_plates = match_tracks(list(tracker['tracks'].values()), plates)
+    for track, plate in pairs:
+        update_track(track, plate, frame, coordinates, now)
+    for plate in new_plates:
+        track = {'id': tracker['next_id'], 'box': plate['coordinates'], 'first_seen': now, 'last_seen': now,
+                 'hits': 0, 'votes': {}, 'best': {}, 'plate_text': '', 'finalized': False}
+        tracker['next_id'] += 1
+        tracker['tracks'][track['id']] = track
+        update_track(track, plate, frame, coordinates, now)
+
+    finished = []
+    for track_id, track in list(tracker['tracks'].items()):
+        track['plate_text'], agreement = get_track_consensus(track)
+        ended = now - track['last_seen'] > SEC_NO_DETECT_CAR
+        if ended:
+            del tracker['tracks'][track_id]
+        if track['finalized'] or track['hits'] < TRACK_MIN_HITS or not is_valid_license_plate(track['plate_text']):
+            continue
+        # Трек сохраняется один раз: при установившихся голосах, по истечении времени детекции или при уходе номера из кадра
+        if ended or agreement >= TRACK_CONVERGENCE or now - track['first_seen'] >= NUM_SEC_FOR_SAVE_CAR_TO_DATABASE:
+            track['finalized'] = True
+            finished.append(track)
+    return finished
+
+def save_track(track, source_name, now):
+    """Сохраняет итоговый номер трека с лучшим кадром."""
+    plate_text = track['plate_text']
+    best = track['best'].get(plate_text) or max(track['best'].values(), key=lambda item: item['score'])
+    plate = dict(best['plate'], plate_text=plate_text)
+    logging.info(f"Трек {track['id']} с камеры {source_name}: номер {plate_text}, кадров {track['hits']}")
+    save_plate_record(best['frame'], best['coordinates'], plate, track['hits'], track['last_seen'] - track['first_seen'], now - track['last_seen'], source_name)
+
+def save_plate_record(frame, coordinates, plate, detect_count, detect_sec, no_detect_sec, source_name):
+    """Сохраняет распознанный номер в датасет и базу данных, если он не сохранялся в пределах окна поиска."""
+    plate_text, plate_img, symbols = plate['plate_text'], plate['plate_img'], plate['symbols']
+
+    # Поиск номера среди недавно сохраненных
+    if search_recent_plate(plate_text, source_name):
+        logging.info(f"Номер {plate_text} с камеры {source_name} уже существует в базе данных. Обновление match_count и time_in_view.")
+        return
+
+    car_image_filename, plate_image_filename = save_image_and_data(frame, coordinates, plate_text, plate_img, symbols, DATASET_DIR, source_name)
+
+    # Сохранение в SQLite, если номер не найден
+    now = datetime.now(timezone.utc)
+    datetime_str = now.strftime("%Y-%m-%d %H:%M:%S")
+    x0, y0, x1, y1 = plate['coordinates']
+    ratio = sum([symbol[1] for symbol in symbols]) / len(symbols) if symbols else 0.0
+    start = time.monotonic()
+    record_id = save_to_sqlite((
+        datetime_str, plate_text, x0, y0, x1, y1, ratio,
+        plate_image_filename, car_image_filename, source_name, detect_count,
+        detect_sec, no_detect_sec, 0,
+        1, 0,  # match_count, time_in_view
+        int(now.timestamp())
+    ))
+    observe_stage('db', source_name, time.monotonic() - start)
+    if record_id is not None:
+        remember_plate(plate_text, source_name, record_id, int(now.timestamp()))
+
+def new_camera_context(camera_id, url, clahe, rect_area, source_name, detection_state, stop_event, capture_mode='snapshot', enhance_mode='full', motion_threshold=MOTION_THRESHOLD):
+    """Создает состояние обработки кадров камеры: настройки, треки номеров и опорный кадр фильтра движения."""
+    return {
+        'camera_id': camera_id,
+        'url': url,
+        'clahe': clahe,
+        'rect_area': rect_area,
+        'source_name': source_name,
+        'detection_state': detection_state,
+        'stop_event': stop_event,
+        'capture_mode': capture_mode,
+        'enhance_mode': enhance_mode,
+        'motion_threshold': motion_threshold,
+        'tracker': {'next_id': 1, 'tracks': {}},
+        'motion_reference': None,  # Уменьшенная ROI последнего кадра, прошедшего через YOLO
+        'skipped_frames': 0,
+        'last_detected': False,
+        'last_frame_time': None
+    }
+
+def handle_frame(context, frame):
+    """Обрабатывает полученный кадр камеры и возвращает признак незавершенных треков номеров."""
+    camera_id, rect_area, source_name = context['camera_id'], context['rect_area'], context['source_name']
+    detection_state, tracker = context['detection_state'], context['tracker']
+    process_start = time.monotonic()
+
+    # Время детекции считается по реально прошедшему времени между кадрами
+    frame_time = time.monotonic()
+    elapsed = frame_time - context['last_frame_time'] if context['last_frame_time'] is not None else 0.0
+    context['last_frame_time'] = frame_time
+
+    # Пока номер не виден и сцена не меняется, детектор не запускается: кадр считается кадром без детекции
+    skipped = False
+    if context['motion_threshold'] > 0:
+        moving, motion_frame = detect_motion(frame, rect_area, context['motion_reference'], context['motion_threshold'])
+        skipped = not moving and not context['last_detected'] and context['skipped_frames'] < MOTION_MAX_SKIPPED_FRAMES
+        if not skipped:
+            context['motion_reference'] = motion_frame
+
+    if skipped:
+        context['skipped_frames'] += 1
+        x0, y0, x1, y1 = rect_area
+        frame, plates = frame[y0:y1, x0:x1], []
+    else:
+        context['skipped_frames'] = 0
+        frame, plates = process_frame(frame, context['clahe'], rect_area, source_name, context['enhance_mode'])
+    record_motion_result(camera_id, skipped)
+    coordinates = [plate['coordinates'] for plate in plates]
+    publish_frame(camera_id, frame, coordinates, ', '.join(plate['plate_text'] for plate in plates))
+    was_detected, detect_count = context['last_detected'], detection_state['detect_count']
+    context['last_detected'] = bool(plates)
+
+    for track in update_tracker(tracker, frame, plates, frame_time):
+        save_track(track, source_name, frame_time)
+    tracking = any(not track['finalized'] for track in tracker['tracks'].values())
+
+    if plates:  # Проверка, были ли обнаружены объекты
+        detection_state['detect_count'] += 1
+        detection_state['no_detect_count'] = 0
+        detection_state['detect_sec'] += elapsed
+        detection_state['no_detect_sec'] = 0
+        detection_state['plate_text'] = ', '.join(track['plate_text'] for track in tracker['tracks'].values() if track['plate_text'])  # Сохранение распознанных номеров
+    else:
+        detection_state['no_detect_count'] += 1
+        detection_state['no_detect_sec'] += elapsed
+        if detection_state['no_detect_sec'] >= SEC_NO_DETECT_CAR:
+            detection_state['detect_count'] = 0  # Сброс счетчика детекций
+            detection_state['detect_sec'] = 0  # Сброс времени детекций
+    # Новая версия статуса только при событиях детекции: кадр с номером, пропажа номера и сброс счетчиков
+    if plates or was_detected or detection_state['detect_count'] != detect_count:
+        mark_camera_changed(camera_id)
+    observe_stage('frame', source_name, time.monotonic() - process_start)
+    return tracking
+
+def capture_frame(context):
     """Захватывает кадр и обрабатывает его."""
-    recent_plates = []
-    plate_count = {}
+    camera_id, url, capture_mode, stop_event = context['camera_id'], context['url'], context['capture_mode'], context['stop_event']
+    stream_version, stream_slot = 0, None
+    if capture_mode == 'stream':
+        stream_slot = get_stream_slot(camera_id)
+        threading.Thread(target=stream_reader, args=(camera_id, url, stream_slot, stop_event, context['source_name']), daemon=True).start()
+
     while not stop_event.is_set():
-        frame = fetch_image_from_url(url, FETCH_IMAGE_DELAY)
+        cycle_start = time.monotonic()
+        if capture_mode == 'stream':
+            stream_version, frame = read_stream_frame(camera_id, stream_slot, stream_version, CAMERA_READ_TIMEOUT)
+        else:
+            frame = fetch_image_from_url(camera_id, url, 0, stop_event, context['source_name'])
         if frame is None:
-            logging.warning(f"Не удалось получить изображение с камеры {source_name}. Переподключение...")
+            logging.warning(f"Не удалось получить изображение с камеры {context['source_name']}. Переподключение...")
             continue
+        tracking = handle_frame(context, frame)
+        stop_event.wait(get_processing_delay(context['detection_state'], time.monotonic() - cycle_start, tracking))
+
+    if capture_mode == 'stream':
+        remove_stream_slot(camera_id, stream_slot)
+
+def get_ingest_loop():
+    """Возвращает цикл событий опроса камер-снимков, при первом обращении запуская его поток и пул обработки кадров."""
+    global ingest_loop, frame_executor
+    with ingest_lock:
+        if ingest_loop is None:
+            frame_executor = ThreadPoolExecutor(max_workers=FRAME_PROCESSING_WORKERS, thread_name_prefix='frame')
+            ingest_loop = asyncio.new_event_loop()
+            threading.Thread(target=ingest_loop.run_forever, name='ingest', daemon=True).start()
+        return ingest_loop
+
+def get_ingest_session():
+    """Возвращает общую HTTP-сессию цикла событий с keep-alive соединениями камер; вызывается только из цикла событий."""
+    global ingest_session
+    if ingest_session is None:
+        ingest_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=INGEST_MAX_CONNECTIONS, limit_per_host=0),
+            # Общий срок запроса ограничивает и медленную отдачу снимка, которую не прерывает таймаут чтения
+            timeout=aiohttp.ClientTimeout(total=CAMERA_CONNECT_TIMEOUT + CAMERA_READ_TIMEOUT,
+                                          sock_connect=CAMERA_CONNECT_TIMEOUT, sock_read=CAMERA_READ_TIMEOUT))
+    return ingest_session
+
+async def fetch_snapshot(camera_id, url, stop_event, source_name):
+    """Получает снимок камеры без блокировки цикла событий с таймаутами и повторными попытками; возвращает байты ответа."""
+    for attempt in range(MAX_RETRY_ATTEMPTS):
+        await asyncio.sleep(get_backoff_delay(camera_id, 0))
+        if stop_event.is_set():
+            return None
+
+        start = time.monotonic()
+        try:
+            async with get_ingest_session().get(url) as response:
+                response.raise_for_status()
+                content = await response.read()
+            # Задержка камеры - только запрос и чтение ответа, без ожидания пула обработки и декодирования
+            record_fetch_result(camera_id, time.monotonic() - start, None)
+            observe_stage('fetch', source_name, time.monotonic() - start)
+            return content
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = str(e) or "превышено время ожидания"
+        record_fetch_result(camera_id, time.monotonic() - start, error)
+        logging.warning(f"Ошибка при попытке {attempt + 1}/{MAX_RETRY_ATTEMPTS} получения изображения с камеры {url}: {error}")
+
+    logging.error(f"Не удалось получить изображение с камеры {url} после {MAX_RETRY_ATTEMPTS} попыток")
+    return None
 
-        frame, coordinates, plate_text, plate_img, symbols = process_frame(frame, plate_model, symbol_model, clahe, rect_area, source_name)
-
-        if coordinates:  # Проверка, были ли обнаружены объекты
-            recent_plates.append(plate_text)
-            if len(recent_plates) > RECENT_ATTEMPTS:
-                recent_plates.pop(0)
-
-            success_rate = recent_plates.count(plate_text) / len(recent_plates)
-            if success_rate >= SUCCESS_RATE_THRESHOLD:
-                detection_state['detect_count'] += 1
-                detection_state['no_detect_count'] = 0
-                detection_state['detect_sec'] += PROCESSING_INTERVAL
-                detection_state['no_detect_sec'] = 0
-                detection_state['plate_text'] = plate_text  # Сохранение распознанного номера
-
-                # Увеличиваем счетчик распознаваний для текущего номера
-                if plate_text in plate_count:
-                    plate_count[plate_text] += 1
-                else:
-                    plate_count[plate_text] = 1
-
-                logging.info(f"Количество распознаваний номера {plate_text} с камеры {source_name}: {plate_count[plate_text]}")
-
-                if detection_state['detect_count'] >= NUM_SEC_FOR_SAVE_CAR_TO_DATABASE:
-                    car_image_filename, plate_image_filename = save_image_and_data(frame, coordinates, plate_text, plate_img, symbols, DATASET_DIR, source_name)
-
-                    # Поиск номера в базе данных
-                    if not search_plate_in_db(plate_text, source_name):
-                        # Сохранение в SQLite, если номер не найден
-                        datetime_str = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-                        x0, y0, x1, y1 = coordinates[0]
-                        ratio = sum([symbol[1] for symbol in symbols]) / len(symbols) if symbols else 0.0
-                        save_to_sqlite((
-                            datetime_str, plate_text, x0, y0, x1, y1, ratio,
-                            plate_image_filename, car_image_filename, source_name, detection_state['detect_count'],
-                            detection_state['detect_sec'], detection_state['no_detect_sec'], 0,
-                            1, 0  # match_count, time_in_view
-                        ))
-
-                    # Сброс счетчика распознаваний для текущего номера
-                    plate_count[plate_text] = 0
-                    detection_state['detect_count'] = 0  # Сброс счетчика детекций
-                    detection_state['detect_sec'] = 0  # Сброс времени детекций
-        else:
-            detection_state['no_detect_count'] += 1
-            detection_state['no_detect_sec'] += PROCESSING_INTERVAL
-            if detection_state['no_detect_count'] >= SEC_NO_DETECT_CAR:
-                detection_state['detect_count'] = 0  # Сброс счетчика детекций
-                detection_state['detect_sec'] = 0  # Сброс времени детекций
+def decode_and_handle_frame(context, content):
+    """Декодирует снимок камеры и обрабатывает кадр; выполняется в пуле обработки кадров."""
+    camera_id, source_name = context['camera_id'], context['source_name']
+    decode_start = time.monotonic()
+    # Декодирование прямо из буфера ответа, без промежуточных копий
+    frame = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR)
+    observe_stage('decode', source_name, time.monotonic() - decode_start)
+    if frame is None:
+        record_fetch_result(camera_id, None, "не удалось декодировать изображение")
+        return None
+    return handle_frame(context, frame)
+
+async def poll_snapshot_camera(context):
+    """Опрашивает камеру-снимок в цикле событий и передает полученные кадры в пул обработки."""
+    camera_id, stop_event = context['camera_id'], context['stop_event']
+    loop = asyncio.get_running_loop()
+    with camera_lock:
+        camera_stats.setdefault(camera_id, new_camera_stats())
 
-        time.sleep(PROCESSING_INTERVAL)
+    while not stop_event.is_set():
+        cycle_start = time.monotonic()
+        snapshot = await fetch_snapshot(camera_id, context['url'], stop_event, context['source_name'])
+        if snapshot is None:
+            logging.warning(f"Не удалось получить изображение с камеры {context['source_name']}. Переподключение...")
+            continue
+        try:
+            # Задача камеры ждет свой кадр, поэтому в пуле не больше одного кадра на камеру
+            tracking = await loop.run_in_executor(frame_executor, decode_and_handle_frame, context, snapshot)
+        except Exception as e:
+            logging.error(f"Ошибка обработки кадра камеры {context['source_name']}: {e}")
+            tracking = False  # Повтор не раньше обычного интервала камеры, иначе ошибка повторяется без паузы
+        if tracking is None:
+            continue  # Снимок не декодирован: пауза перед повтором задается задержкой после ошибки в fetch_snapshot
+        # Следующий запрос отсчитывается от начала цикла: время сети и обработки входит в интервал
+        await asyncio.sleep(get_processing_delay(context['detection_state'], time.monotonic() - cycle_start, tracking))
+
+def start_camera(context):
+    """Запускает получение кадров камеры: задачей общего цикла событий или отдельным потоком; возвращает задачу или поток."""
+    if context['capture_mode'] == 'snapshot' and INGEST_ENGINE == 'asyncio':
+        return asyncio.run_coroutine_threadsafe(poll_snapshot_camera(context), get_ingest_loop())
+    thread = threading.Thread(target=capture_frame, args=(context,), daemon=True)
+    thread.start()
+    return thread
+
+def stop_camera(worker, stop_event):
+    """Останавливает получение кадров камеры, запущенное start_camera."""
+    stop_event.set()
+    if isinstance(worker, Future):
+        worker.cancel()  # Прерывает ожидание ответа камеры или паузу между кадрами
 
 @app.route('/status')
 def get_status():
     """Возвращает текущий статус распознавания для каждого источника в формате JSON."""
-    status = []
-    for url, detection_state in detection_states.items():
-        source_name = source_names[list(detection_states.keys()).index(url)]
-        status.append({
-            'source': source_name,
-            'detect_count': detection_state['detect_count'],
-            'no_detect_count': detection_state['no_detect_count'],
-            'detect_time': detection_state['detect_sec'],
-            'no_detect_time': detection_state['no_detect_sec']
-        })
-    return jsonify(status)
+    status = [camera_status(camera_id) for camera_id in list(camera_registry)]
+    return jsonify([camera for camera in status if camera is not None])
 
-def generate_frames(url, rect_area, source_name, detection_state):
-    """Генератор для потоковой передачи кадров."""
-    while True:
-        frame = fetch_image_from_url(url, FETCH_IMAGE_DELAY)  # Задержка в 1 секунду
-        if frame is not None:
-            frame, coordinates, plate_text, _, _ = process_frame(frame, plate_model, symbol_model, clahe, rect_area, source_name)
-
-            # Рисование рамки на изображении
-            for x1, y1, x2, y2 in coordinates:
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-
-            ret, buffer = cv2.imencode('.jpg', frame)
-            frame = buffer.tobytes()
+def generate_frames(camera_id):
+    """Генератор для потоковой передачи кадров из общего слота камеры."""
+    update_frame_viewers(camera_id, 1)
+    try:
+        version = 0
+        while camera_id in rect_cam:
+            version, frame = read_frame_jpeg(camera_id, version, FRAME_BUS_TIMEOUT)
+            if frame is None:
+                continue
 
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+    finally:
+        update_frame_viewers(camera_id, -1)
+
+def update_frame_viewers(camera_id, delta):
+    """Учитывает подключение или отключение зрителя камеры; при первом зрителе и уходе последнего сообщает процессу обработки."""
+    with frame_bus_lock:
+        viewers = frame_bus_viewers.get(camera_id, 0) + delta
+        if viewers > 0:
+            frame_bus_viewers[camera_id] = viewers
+        else:
+            frame_bus_viewers.pop(camera_id, None)
+        # Команда ставится под блокировкой, чтобы процесс обработки получал списки зрителей в порядке изменений
+        if (viewers > 0) != (viewers - delta > 0) and WORKER_PROCESSES and worker_index is None:
+            index = camera_id % WORKER_PROCESSES
+            if index < len(worker_commands):
+                worker_commands[index].put(('viewed_cameras', get_viewed_cameras(index)))
+
+def get_viewed_cameras(index):
+    """Возвращает id камер процесса обработки с указанным номером, у которых есть зрители. Вызывается под frame_bus_lock."""
+    return [camera_id for camera_id in frame_bus_viewers if camera_id % WORKER_PROCESSES == index]
 
 @app.route('/')
 def index():
@@ -533,12 +1977,15 @@ def index():
         $(document).ready(function() {
             var socket = io.connect('http://' + document.domain + ':' + location.port);
 
-            socket.on('status_update', function(data) {
+            // Сервер присылает только изменившиеся камеры: статус каждой камеры заменяется на месте
+            socket.on('status_delta', function(data) {
                 var statusContainer = $('#status-container');
-                statusContainer.empty();
-                data.forEach(function(item) {
+                data.removed.forEach(function(cameraId) {
+                    $(`#status-${cameraId}`).remove();
+                });
+                data.cameras.forEach(function(item) {
                     var statusItem = $(
-                        `<div class="status-thumbnail">
+                        `<div class="status-thumbnail" id="status-${item.camera_id}">
                             <h6>${item.source}</h6>
                             <p>Детекций: ${item.detect_count}</p>
                             <p>Секунд без детекции: ${item.no_detect_count}</p>
@@ -546,13 +1993,13 @@ def index():
                             <p>Время без детекции: ${item.no_detect_time.toFixed(2)} с</p>
                         </div>`
                     );
-                    statusContainer.append(statusItem);
-                });
-            });
-
-            socket.on('plate_text_update', function(data) {
-                data.forEach(function(item) {
-                    $(`#plate-text-${item.source_index}`).text(item.plate_text);
+                    var current = $(`#status-${item.camera_id}`);
+                    if (current.length) {
+                        current.replaceWith(statusItem);
+                    } else {
+                        statusContainer.append(statusItem);
+                    }
+                    $(`#plate-text-${item.camera_id}`).text(item.plate_text);
                 });
             });
         });
@@ -561,11 +2008,11 @@ def index():
 <body>
     <div class="container">
         <div class="camera-container">
-            {% for source_name in source_names %}
+            {% for camera in cameras %}
                 <div class="camera-box">
-                    <h6 class="text-center">{{ source_name }}</h6>
-                    <p class="text-center" id="plate-text-{{ loop.index0 }}"></p>
-                    <img src="{{ url_for('video_feed', source_index=loop.index0) }}" width="640" height="480">
+                    <h6 class="text-center">{{ camera.name }}</h6>
+                    <p class="text-center" id="plate-text-{{ camera.id }}"></p>
+                    <img src="{{ url_for('video_feed', camera_id=camera.id) }}" width="640" height="480">
                 </div>
             {% endfor %}
         </div>
@@ -574,28 +2021,51 @@ def index():
     <script src="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/js/bootstrap.bundle.min.js"></script>
 </body>
 </html>
-    ''', source_names=source_names)
+    ''', cameras=list(camera_registry.values()))
 
 @app.route('/plate_text')
 def get_plate_text():
     """Возвращает распознанные номера для каждой камеры."""
     plate_texts = []
-    for url, detection_state in detection_states.items():
-        source_name = source_names[list(detection_states.keys()).index(url)]
-        plate_texts.append({
-            'source_index': list(detection_states.keys()).index(url),
-            'source_name': source_name,
-            'plate_text': detection_state.get('plate_text', '')
-        })
+    for source_index, camera_id in enumerate(list(camera_registry)):
+        status = camera_status(camera_id)
+        if status is not None:
+            plate_texts.append({
+                'source_index': source_index,
+                'camera_id': camera_id,
+                'source_name': status['source'],
+                'plate_text': status['plate_text']
+            })
     return jsonify(plate_texts)
 
-@app.route('/video_feed/<int:source_index>')
-def video_feed(source_index):
-    url = list(detection_states.keys())[source_index]
-    rect_area = rect_cam[url]
-    source_name = source_names[source_index]
-    detection_state = detection_states[url]
-    return Response(generate_frames(url, rect_area, source_name, detection_state), mimetype='multipart/x-mixed-replace; boundary=frame')
+@app.route('/video_feed/<int:camera_id>')
+def video_feed(camera_id):
+    if camera_id not in camera_registry:
+        return jsonify({"error": "Камера не найдена"}), 404
+    return Response(generate_frames(camera_id), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+# Поля камеры в порядке столбцов таблицы cameras; первые шесть обязательны
+CAMERA_FIELDS = ('url', 'x0', 'y0', 'x1', 'y1', 'name', 'capture_mode', 'enhance_mode', 'motion_threshold')
+
+def validate_camera_fields(fields):
+    """Проверяет и приводит к нужным типам поля камеры; возвращает текст ошибки или None."""
+    if not all(fields.get(field) is not None and fields.get(field) != '' for field in CAMERA_FIELDS[:6]):
+        return "Все поля обязательны для заполнения"
+
+    if fields['capture_mode'] not in CAPTURE_MODES:
+        return f"Неверный режим получения кадров. Допустимые значения: {', '.join(CAPTURE_MODES)}"
+
+    if fields['enhance_mode'] not in ENHANCE_MODES:
+        return f"Неверный режим улучшения контраста. Допустимые значения: {', '.join(ENHANCE_MODES)}"
+
+    if fields['motion_threshold'] is not None:
+        fields['motion_threshold'] = float(fields['motion_threshold'])
+        if not 0 <= fields['motion_threshold'] <= 1:
+            return "Порог движения должен быть в диапазоне от 0 до 1"
+
+    for field in ('x0', 'y0', 'x1', 'y1'):
+        fields[field] = float(fields[field])
+    return None
 
 @app.route('/add_camera', methods=['POST'])
 def add_camera():
@@ -604,42 +2074,61 @@ def add_camera():
         data = request.json
         logging.info("Полученные данные: %s", data)
 
-        url = data.get('url')
-        x0 = data.get('x0')
-        y0 = data.get('y0')
-        x1 = data.get('x1')
-        y1 = data.get('y1')
-        name = data.get('name')
-
-        if not all(v is not None and v != '' for v in [url, x0, y0, x1, y1, name]):
-            return jsonify({"error": "Все поля обязательны для заполнения"}), 400
-
-        x0, y0, x1, y1 = map(float, (x0, y0, x1, y1))
-
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        fields = {field: data.get(field) for field in CAMERA_FIELDS}
+        fields['capture_mode'] = data.get('capture_mode', 'auto')
+        fields['enhance_mode'] = data.get('enhance_mode', 'full')
+        error = validate_camera_fields(fields)
+        if error:
+            return jsonify({"error": error}), 400
 
         # Отладка существующих записей
-        cursor.execute("SELECT name FROM cameras")
-        cameras = cursor.fetchall()
+        cameras = db_read("SELECT name FROM cameras")
         logging.info("Текущие камеры в базе данных: %s", cameras)
 
         # Проверка уникальности имени
-        cursor.execute("SELECT * FROM cameras WHERE name = ?", (name,))
-        existing_camera = cursor.fetchone()
+        existing_camera = db_read("SELECT * FROM cameras WHERE name = ?", (fields['name'],))
         if existing_camera:
-            conn.close()
             return jsonify({"error": "Камера с таким именем уже существует"}), 409
 
         # Добавление камеры
-        cursor.execute("""
-            INSERT INTO cameras (url, x0, y0, x1, y1, name)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (url, x0, y0, x1, y1, name))
-        conn.commit()
-        conn.close()
+        camera_id, _ = db_write("""
+            INSERT INTO cameras (url, x0, y0, x1, y1, name, capture_mode, enhance_mode, motion_threshold)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, tuple(fields[field] for field in CAMERA_FIELDS), wait=True)
+        notify_camera_change(camera_id)
+
+        return jsonify({"message": "Камера добавлена успешно", "id": camera_id}), 201
+
+    except Exception as e:
+        logging.error("Ошибка: %s", str(e))
+        return jsonify({"error": "Внутренняя ошибка сервера"}), 500
+
+@app.route('/update_camera/<string:camera_name>', methods=['PUT'])
+def update_camera(camera_name):
+    """Изменяет переданные поля камеры; ROI, имя, режим улучшения и порог движения применяются без перезапуска камеры."""
+    try:
+        data = request.json or {}
+        camera = db_read(f"SELECT id, {', '.join(CAMERA_FIELDS)} FROM cameras WHERE name = ?", (camera_name,))
+        if not camera:
+            return jsonify({"error": "Камера не найдена"}), 404
+
+        camera_id = camera[0][0]
+        fields = dict(zip(CAMERA_FIELDS, camera[0][1:]))
+        fields['capture_mode'] = fields['capture_mode'] or 'auto'
+        fields['enhance_mode'] = fields['enhance_mode'] or 'full'
+        fields.update((field, data[field]) for field in CAMERA_FIELDS if field in data)
+        error = validate_camera_fields(fields)
+        if error:
+            return jsonify({"error": error}), 400
+
+        if fields['name'] != camera_name and db_read("SELECT 1 FROM cameras WHERE name = ?", (fields['name'],)):
+            return jsonify({"error": "Камера с таким именем уже существует"}), 409
 
-        return jsonify({"message": "Камера добавлена успешно"}), 201
+        db_write(f"UPDATE cameras SET {', '.join(f'{field} = ?' for field in CAMERA_FIELDS)} WHERE id = ?",
+                 tuple(fields[field] for field in CAMERA_FIELDS) + (camera_id,), wait=True)
+        notify_camera_change(camera_id)
+
+        return jsonify({"message": "Камера обновлена успешно", "id": camera_id}), 200
 
     except Exception as e:
         logging.error("Ошибка: %s", str(e))
@@ -649,20 +2138,14 @@ def add_camera():
 def delete_camera(camera_name):
     """Удаляет камеру из таблицы cameras по её имени."""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
         # Проверяем существование камеры
-        cursor.execute("SELECT * FROM cameras WHERE name = ?", (camera_name,))
-        camera = cursor.fetchone()
+        camera = db_read("SELECT id FROM cameras WHERE name = ?", (camera_name,))
         if not camera:
-            conn.close()
             return jsonify({"error": "Камера не найдена"}), 404
 
         # Удаляем камеру
-        cursor.execute("DELETE FROM cameras WHERE name = ?", (camera_name,))
-        conn.commit()
-        conn.close()
+        db_write("DELETE FROM cameras WHERE id = ?", (camera[0][0],), wait=True)
+        notify_camera_change(camera[0][0])
 
         return jsonify({"message": "Камера удалена успешно"}), 200
 
@@ -673,11 +2156,7 @@ def delete_camera(camera_name):
 @app.route('/cameras', methods=['GET'])
 def get_cameras():
     """Возвращает список всех камер из таблицы cameras."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM cameras")
-    cameras = cursor.fetchall()
-    conn.close()
+    cameras = db_read("SELECT * FROM cameras")
 
     cameras_list = []
     for camera in cameras:
@@ -688,11 +2167,347 @@ def get_cameras():
             "y0": camera[3],
             "x1": camera[4],
             "y1": camera[5],
-            "name": camera[6]
+            "name": camera[6],
+            "capture_mode": camera[7] or 'auto',
+            "enhance_mode": camera[8] or 'full',
+            "motion_threshold": MOTION_THRESHOLD if camera[9] is None else camera[9]
         })
 
     return jsonify(cameras_list), 200
 
+# Столбцы записей, возвращаемые /records и /records/export
+RECORD_COLUMNS = ('id', 'time', 'datetime', 'key', 'source', 'x0', 'y0', 'x1', 'y1', 'ratio', 'photo_plate', 'photo_care',
+                  'detect_count', 'detect_sec', 'no_detect_sec', 'send_to_server_code', 'match_count', 'time_in_view',
+                  'send_attempts', 'send_time')
+
+# Столбцы записей, доставляемые вышестоящему серверу, без служебных полей доставки
+OUTBOX_COLUMNS = tuple(column for column in RECORD_COLUMNS if column not in ('send_to_server_code', 'send_attempts', 'send_time'))
+
+def parse_record_time(value):
+    """Разбирает время фильтра: секунды эпохи или дата и время ISO 8601 (без часового пояса - UTC)."""
+    try:
+        return int(value)
+    except ValueError:
+        if value[-1:] in ('Z', 'z'):
+            value = value[:-1] + '+00:00'  # datetime.fromisoformat до Python 3.11 не принимает суффикс Z
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return int(moment.timestamp())
+
+def parse_records_filters(args):
+    """Строит условия выборки записей по префиксу номера, источнику и интервалу времени; бросает ValueError при неверном параметре."""
+    # Записи без времени в секундах эпохи еще не переведены backfill_record_time и в выборку не попадают
+    conditions, params = ["time IS NOT NULL"], []
+    plate = args.get('plate')
+    if plate:
+        # Префикс как диапазон ключей, чтобы использовался индекс по key
+        conditions.append("key >= ? AND key < ?")
+        params += [plate, plate[:-1] + chr(ord(plate[-1]) + 1)]
+    if args.get('source'):
+        conditions.append("source = ?")
+        params.append(args['source'])
+    for name, operator in (('since', '>='), ('until', '<')):
+        if args.get(name):
+            try:
+                params.append(parse_record_time(args[name]))
+            except ValueError:
+                raise ValueError(f"Неверное значение параметра {name}: ожидаются секунды эпохи или дата ISO 8601")
+            conditions.append(f"time {operator} ?")
+    return conditions, params
+
+def parse_records_cursor(cursor):
+    """Разбирает курсор страницы вида <time>:<id>; возвращает None для первой страницы."""
+    if not cursor:
+        return None
+    try:
+        record_time, record_id = map(int, cursor.split(':'))
+    except ValueError:
+        raise ValueError("Неверный курсор страницы")
+    return record_time, record_id
+
+def build_records_query(conditions, params, after, descending, limit):
+    """Возвращает запрос страницы записей после курсора (time, id) в заданном порядке и его параметры."""
+    conditions, params = list(conditions), list(params)
+    if after is not None:
+        conditions.append(f"(time, id) {'<' if descending else '>'} (?, ?)")
+        params += after
+    order = 'DESC' if descending else 'ASC'
+    sql = (f"SELECT {', '.join(RECORD_COLUMNS)} FROM record WHERE {' AND '.join(conditions)} "
+           f"ORDER BY time {order}, id {order} LIMIT ?")
+    return sql, params + [limit]
+
+@app.route('/records', methods=['GET'])
+def get_records():
+    """Возвращает страницу записей распознавания, новые первыми, с курсором следующей страницы."""
+    try:
+        conditions, params = parse_records_filters(request.args)
+        after = parse_records_cursor(request.args.get('cursor'))
+        try:
+            limit = int(request.args.get('limit', RECORDS_PAGE_SIZE))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= RECORDS_MAX_PAGE_SIZE:
+            raise ValueError(f"Параметр limit должен быть в диапазоне от 1 до {RECORDS_MAX_PAGE_SIZE}")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Лишняя запись показывает, есть ли следующая страница
+    rows = db_read(*build_records_query(conditions, params, after, True, limit + 1))
+    records = [dict(zip(RECORD_COLUMNS, row)) for row in rows[:limit]]
+    next_cursor = f"{records[-1]['time']}:{records[-1]['id']}" if len(rows) > limit else None
+    return jsonify({'records': records, 'next_cursor': next_cursor}), 200
+
+def iter_records(conditions, params):
+    """Выдает записи по возрастанию времени короткими запросами по RECORDS_EXPORT_BATCH_SIZE записей."""
+    # Отдельное соединение не занимает пул чтения; между пачками не удерживается снимок WAL,
+    # поэтому долгая выгрузка не мешает записи и контрольным точкам
+    conn = connect_db()
+    try:
+        after = None
+        while True:
+            cursor = conn.execute(*build_records_query(conditions, params, after, False, RECORDS_EXPORT_BATCH_SIZE))
+            count = 0
+            for row in cursor:
+                count += 1
+                yield row
+            if count < RECORDS_EXPORT_BATCH_SIZE:
+                return
+            after = (row[1], row[0])
+    finally:
+        conn.close()
+
+def format_records_ndjson(rows):
+    """Преобразует записи в строки NDJSON."""
+    for row in rows:
+        yield json.dumps(dict(zip(RECORD_COLUMNS, row)), ensure_ascii=False) + '\n'
+
+def format_records_csv(rows):
+    """Преобразует записи в CSV с заголовком, по строке на запись."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(RECORD_COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+@app.route('/records/export', methods=['GET'])
+def export_records():
+    """Выгружает записи распознавания в NDJSON или CSV потоком, не загружая их в память."""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"error": "Неверный формат выгрузки. Допустимые значения: ndjson, csv"}), 400
+    try:
+        conditions, params = parse_records_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    rows = iter_records(conditions, params)
+    if export_format == 'csv':
+        body, mimetype = format_records_csv(rows), 'text/csv'
+    else:
+        body, mimetype = format_records_ndjson(rows), 'application/x-ndjson'
+    return Response(body, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename=records.{export_format}'})
+
+def camera_stats_snapshot():
+    """Возвращает копию статистики получения кадров по камерам текущего процесса."""
+    with camera_lock:
+        return {camera_id: dict(camera_stat) for camera_id, camera_stat in camera_stats.items()}
+
+def dataset_metrics_snapshot():
+    """Возвращает метрики фоновой записи датасета текущего процесса."""
+    with dataset_metrics_lock:
+        metrics = dict(dataset_metrics)
+    metrics['queue_depth'] = dataset_queue.qsize()
+    metrics['queue_size'] = DATASET_WRITER_QUEUE_SIZE
+    return metrics
+
+def db_metrics_snapshot():
+    """Возвращает метрики потока записи SQLite текущего процесса."""
+    with db_metrics_lock:
+        metrics = dict(db_metrics)
+    metrics['write_queue_depth'] = db_write_queue.qsize()
+    return metrics
+
+def stage_metrics_snapshot():
+    """Возвращает копию гистограмм задержек этапов текущего процесса."""
+    with stage_metrics_lock:
+        return {key: {'counts': list(histogram['counts']), 'sum': histogram['sum']} for key, histogram in stage_metrics.items()}
+
+def queue_depths():
+    """Возвращает глубину внутренних очередей текущего процесса."""
+    depths = {
+        'inference': inference_queue.qsize(),
+        'dataset': dataset_queue.qsize(),
+        'db_write': db_write_queue.qsize()
+    }
+    if worker_event_queue is not None:
+        depths['worker_events'] = worker_event_queue.qsize()
+    return depths
+
+def frame_ring_metrics_snapshot():
+    """Возвращает счетчики кадров, переданных процессом обработки через разделяемую память и через очередь."""
+    with frame_ring_metrics_lock:
+        return dict(frame_ring_metrics)
+
+def process_metrics_snapshot():
+    """Собирает все метрики текущего процесса для /metrics и для передачи процессу веб-сервера."""
+    return {
+        'model': model_metrics_snapshot(),
+        'model_status': get_model_status(),
+        'cameras': camera_stats_snapshot(),
+        'dataset': dataset_metrics_snapshot(),
+        'db': db_metrics_snapshot(),
+        'stages': stage_metrics_snapshot(),
+        'queues': queue_depths(),
+        'frame_ring': frame_ring_metrics_snapshot()
+    }
+
+def format_metric_labels(labels):
+    """Форматирует метки метрики Prometheus с экранированием значений."""
+    return ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for key, value in labels.items())
+
+def render_metric(lines, name, metric_type, help_text, samples):
+    """Добавляет метрику в текстовом формате Prometheus: описание, тип и значения [(метки, значение)]."""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {metric_type}")
+    for labels, value in samples:
+        lines.append(f"{name}{{{format_metric_labels(labels)}}} {value}" if labels else f"{name} {value}")
+
+def render_prometheus_metrics(processes, camera_names, outbox=None):
+    """Формирует текст /metrics из снимков метрик процессов {имя процесса: снимок} и метрик доставки записей."""
+    lines = []
+
+    # Гистограммы этапов: камеры процессов не пересекаются, одинаковые ключи суммируются
+    stages = {}
+    for snapshot in processes.values():
+        for key, histogram in snapshot['stages'].items():
+            merged = stages.setdefault(key, {'counts': [0] * len(histogram['counts']), 'sum': 0.0})
+            merged['counts'] = [a + b for a, b in zip(merged['counts'], histogram['counts'])]
+            merged['sum'] += histogram['sum']
+    samples = []
+    for (stage, camera), histogram in sorted(stages.items()):
+        cumulative = 0
+        for bound, count in zip(METRICS_LATENCY_BUCKETS + ('+Inf',), histogram['counts']):
+            cumulative += count
+            samples.append(({'stage': stage, 'camera': camera, 'le': bound}, cumulative))
+    lines.append("# HELP lpr_stage_duration_seconds Длительность этапов обработки кадра по камерам")
+    lines.append("# TYPE lpr_stage_duration_seconds histogram")
+    for labels, value in samples:
+        lines.append(f"lpr_stage_duration_seconds_bucket{{{format_metric_labels(labels)}}} {value}")
+    for (stage, camera), histogram in sorted(stages.items()):
+        labels = format_metric_labels({'stage': stage, 'camera': camera})
+        lines.append(f"lpr_stage_duration_seconds_sum{{{labels}}} {histogram['sum']}")
+        lines.append(f"lpr_stage_duration_seconds_count{{{labels}}} {sum(histogram['counts'])}")
+
+    cameras = {}
+    for snapshot in processes.values():
+        cameras.update(snapshot['cameras'])
+
+    def camera_samples(key):
+        return [({'camera': camera_names.get(camera_id, camera_id)}, stats[key]) for camera_id, stats in sorted(cameras.items())]
+
+    render_metric(lines, 'lpr_camera_fps', 'gauge', "Сглаженная частота кадров камеры", camera_samples('fps'))
+    render_metric(lines, 'lpr_camera_frames_processed_total', 'counter', "Кадры, прошедшие через модели", camera_samples('processed_frames'))
+    render_metric(lines, 'lpr_camera_frames_skipped_total', 'counter', "Кадры, пропущенные фильтром движения", camera_samples('skipped_frames'))
+    render_metric(lines, 'lpr_camera_frames_dropped_total', 'counter', "Устаревшие кадры потока, отброшенные без обработки", camera_samples('dropped_frames'))
+    render_metric(lines, 'lpr_camera_requests_total', 'counter', "Запросы кадров к камере", camera_samples('requests'))
+    render_metric(lines, 'lpr_camera_errors_total', 'counter', "Ошибки получения кадров", camera_samples('errors'))
+
+    render_metric(lines, 'lpr_queue_depth', 'gauge', "Глубина внутренних очередей", [
+        ({'process': process, 'queue': name}, depth)
+        for process, snapshot in processes.items() for name, depth in sorted(snapshot['queues'].items())
+    ])
+
+    totals = {}
+    for snapshot in processes.values():
+        for model_type, values in snapshot['model'].items():
+            total = totals.setdefault(model_type, {'total_frames': 0, 'detected_frames': 0})
+            total['total_frames'] += values['total_frames']
+            total['detected_frames'] += values['detected_frames']
+    render_metric(lines, 'lpr_model_frames_total', 'counter', "Кадры, обработанные моделью",
+                  [({'model': model_type}, values['total_frames']) for model_type, values in sorted(totals.items())])
+    render_metric(lines, 'lpr_model_detected_frames_total', 'counter', "Кадры с распознанным номером",
+                  [({'model': model_type}, values['detected_frames']) for model_type, values in sorted(totals.items())])
+    render_metric(lines, 'lpr_model_version', 'gauge', "Активная версия модели", [
+        ({'process': process, 'model': model_type}, status['version'])
+        for process, snapshot in processes.items() for model_type, status in sorted(snapshot['model_status'].items()) if 'version' in status
+    ])
+
+    render_metric(lines, 'lpr_db_transactions_total', 'counter', "Транзакции потока записи SQLite",
+                  [({'process': process}, snapshot['db']['transactions']) for process, snapshot in processes.items()])
+    render_metric(lines, 'lpr_db_errors_total', 'counter', "Ошибки записи в SQLite",
+                  [({'process': process}, snapshot['db']['errors']) for process, snapshot in processes.items()])
+    render_metric(lines, 'lpr_dataset_written_total', 'counter', "Записанные на диск наборы файлов датасета",
+                  [({'process': process}, snapshot['dataset']['written']) for process, snapshot in processes.items()])
+    render_metric(lines, 'lpr_dataset_dropped_total', 'counter', "Наборы файлов датасета, отброшенные при заполненной очереди",
+                  [({'process': process}, snapshot['dataset']['dropped']) for process, snapshot in processes.items()])
+    render_metric(lines, 'lpr_frame_ring_frames_total', 'counter', "Кадры процессов обработки для видеопотока по способу передачи", [
+        ({'process': process, 'transport': transport}, snapshot['frame_ring'][f'{transport}_frames'])
+        for process, snapshot in processes.items() if process != 'main' for transport in ('ring', 'queue')
+    ])
+
+    if outbox is not None:
+        render_metric(lines, 'lpr_outbox_records_total', 'counter', "Записи, доставленные вышестоящему серверу или отклоненные им",
+                      [({'result': 'delivered'}, outbox['delivered']), ({'result': 'rejected'}, outbox['rejected'])])
+        render_metric(lines, 'lpr_outbox_failures_total', 'counter', "Неудачные запросы доставки, которые будут повторены", [({}, outbox['failures'])])
+        render_metric(lines, 'lpr_outbox_pending_records', 'gauge', "Неотправленные записи", [({}, outbox['pending'])])
+        render_metric(lines, 'lpr_outbox_lag_seconds', 'gauge', "Возраст старейшей неотправленной записи", [({}, outbox['lag_sec'])])
+    return '\n'.join(lines) + '\n'
+
+@app.route('/metrics', methods=['GET'])
+def get_prometheus_metrics():
+    """Возвращает метрики всех процессов в текстовом формате Prometheus."""
+    processes = {'main': process_metrics_snapshot()}
+    with worker_metrics_lock:
+        for index, metrics in sorted(worker_metrics.items()):
+            processes[f"worker-{index}"] = metrics
+    camera_names = {camera_id: config['name'] for camera_id, config in list(camera_registry.items())}
+    outbox = outbox_metrics_snapshot() if OUTBOX_URL is not None else None
+    return Response(render_prometheus_metrics(processes, camera_names, outbox), mimetype='text/plain; version=0.0.4')
+
+def get_worker_metrics(name):
+    """Возвращает последние метрики указанного вида, присланные процессами обработки."""
+    with worker_metrics_lock:
+        return {index: metrics[name] for index, metrics in sorted(worker_metrics.items())}
+
+@app.route('/camera_stats', methods=['GET'])
+def get_camera_stats():
+    """Возвращает задержки и счетчики ошибок получения кадров по камерам."""
+    all_stats = camera_stats_snapshot()
+    for worker_stats in get_worker_metrics('cameras').values():
+        all_stats.update(worker_stats)
+    stats = []
+    for camera_id, camera_stat in all_stats.items():
+        config = camera_registry.get(camera_id, {})
+        stats.append({'camera_id': camera_id, 'source': config.get('name', ''), 'url': config.get('url', ''), **camera_stat})
+    return jsonify(stats), 200
+
+@app.route('/dataset_metrics', methods=['GET'])
+def get_dataset_metrics():
+    """Возвращает глубину очереди и задержку фоновой записи датасета."""
+    metrics = dataset_metrics_snapshot()
+    if WORKER_PROCESSES:
+        metrics['workers'] = get_worker_metrics('dataset')
+    return jsonify(metrics), 200
+
+@app.route('/db_metrics', methods=['GET'])
+def get_db_metrics():
+    """Возвращает метрики транзакций потока записи SQLite."""
+    metrics = db_metrics_snapshot()
+    if WORKER_PROCESSES:
+        metrics['workers'] = get_worker_metrics('db')
+    return jsonify(metrics), 200
+
+@app.route('/outbox_metrics', methods=['GET'])
+def get_outbox_metrics():
+    """Возвращает скорость, отставание и счетчики доставки записей вышестоящему серверу."""
+    return jsonify(outbox_metrics_snapshot()), 200
+
 @app.route('/update_model', methods=['POST'])
 def update_model():
     """Обновляет модель YOLO."""
@@ -707,125 +2522,574 @@ def update_model():
         if not model_path:
             return jsonify({"error": "Путь к модели обязателен"}), 400
 
-        global plate_model, symbol_model
-
-        if model_type == 'plate':
-            logging.info(f"Загрузка новой модели для плат из {model_path}...")
-            plate_model = YOLO(model_path)
-            logging.info("Новая модель для плат загружена.")
-        elif model_type == 'symbol':
-            logging.info(f"Загрузка новой модели для символов из {model_path}...")
-            symbol_model = YOLO(model_path)
-            logging.info("Новая модель для символов загружена.")
+        backend = data.get('backend')
+        if backend is not None and backend not in MODEL_BACKENDS:
+            return jsonify({"error": f"Неверный бэкенд модели. Допустимые значения: {', '.join(MODEL_BACKENDS)}"}), 400
+
+        # Квантованная модель символов допускается, только если по ее отчету точность не упала сильнее порога
+        rejection = check_quantized_model(model_path, backend) if model_type == 'symbol' else None
+        if rejection is not None:
+            return jsonify(rejection), 400
+
+        with model_registry_lock:
+            model_versions[model_type] += 1
+            version = model_versions[model_type]
+
+        if WORKER_PROCESSES:
+            # Модели загружены в процессах обработки: команда передается каждому из них
+            command = ('update_model', model_type, model_path, backend, version)
+            worker_model_updates[model_type] = command
+            for commands in worker_commands:
+                commands.put(command)
+        else:
+            threading.Thread(target=load_model, args=(model_type, model_path, backend, version), daemon=True).start()
 
-        return jsonify({"message": "Модель успешно обновлена"}), 200
+        # Загрузка, прогрев и подмена идут в фоне, результат виден в /model_metrics
+        return jsonify({"message": "Модель загружается", "model_type": model_type, "version": version}), 202
 
     except Exception as e:
         logging.error("Ошибка при обновлении модели: %s", str(e))
         return jsonify({"error": "Внутренняя ошибка сервера"}), 500
 
+def get_quantization_report_path(model_path):
+    """Возвращает путь к отчету о квантовании, сохраняемому рядом с моделью."""
+    return os.path.splitext(model_path.rstrip('/\\'))[0] + '.quant.json'
+
+def get_quantization_report(model_path):
+    """Возвращает отчет о квантовании модели или None, если отчета рядом с моделью нет."""
+    report_path = get_quantization_report_path(model_path)
+    if not os.path.exists(report_path):
+        return None
+    with open(report_path) as f:
+        return json.load(f)
+
+def is_quantized_model(model_path, backend=None):
+    """Проверяет по графу экспортированной модели, содержит ли она операции INT8-квантования."""
+    backend = resolve_model_backend(model_path, backend)
+    if backend == 'onnx':
+        import onnx
+        op_types = {node.op_type for node in onnx.load(model_path, load_external_data=False).graph.node}
+    elif backend == 'openvino':
+        import openvino as ov
+        if os.path.isdir(model_path):
+            model_path = glob.glob(os.path.join(model_path, '*.xml'))[0]
+        op_types = {op.get_type_name() for op in ov.Core().read_model(model_path).get_ops()}
+    else:
+        return False
+    return not op_types.isdisjoint(QUANTIZED_OP_TYPES)
+
+def check_quantized_model(model_path, backend=None):
+    """Проверяет отчет о квантовании модели символов; возвращает тело ответа с причиной отказа или None."""
+    try:
+        report = get_quantization_report(model_path)
+    except (OSError, ValueError) as e:
+        return {"error": f"Не удалось прочитать отчет о квантовании {get_quantization_report_path(model_path)}: {e}"}
+
+    if report is None:
+        # Отчет мог не попасть рядом с моделью: квантованная модель определяется по ее графу
+        if not os.path.exists(model_path):
+            return None  # Ошибка пути будет видна в /model_metrics после попытки загрузки
+        try:
+            quantized = is_quantized_model(model_path, backend)
+        except ImportError as e:
+            return {"error": f"Для проверки модели символов без отчета о квантовании нужен пакет {e.name or 'onnx'}: pip install {e.name or 'onnx'}"}
+        except Exception as e:
+            return {"error": f"Не удалось проверить, квантована ли модель: {e}"}
+        if quantized:
+            return {"error": "Квантованная модель символов загружается только вместе с отчетом quantize_symbols.py о точности",
+                    "report_path": get_quantization_report_path(model_path)}
+        return None
+
+    accuracy_drop = report.get('accuracy_drop') if isinstance(report, dict) else None
+    if isinstance(accuracy_drop, bool) or not isinstance(accuracy_drop, (int, float)) or not math.isfinite(accuracy_drop):
+        return {"error": "Отчет о квантовании не содержит числового поля accuracy_drop",
+                "report_path": get_quantization_report_path(model_path)}
+    if accuracy_drop > QUANTIZED_MAX_ACCURACY_DROP:
+        return {
+            "error": "Снижение посимвольной точности квантованной модели превышает допустимое",
+            "accuracy_drop": accuracy_drop,
+            "max_accuracy_drop": QUANTIZED_MAX_ACCURACY_DROP
+        }
+    return None
+
+def acquire_model(model_type):
+    """Возвращает активную версию модели, отмечая ее использование до вызова release_model."""
+    with model_registry_lock:
+        handle = model_registry[model_type]
+        handle['in_flight'] += 1
+        return handle
+
+def release_model(handle):
+    """Снимает отметку использования версии модели и освобождает замененную версию после последнего вызова."""
+    with model_registry_lock:
+        handle['in_flight'] -= 1
+        if handle['retired'] and handle['in_flight'] == 0:
+            free_model(handle)
+
+def free_model(handle):
+    """Освобождает модель замененной версии. Вызывается под model_registry_lock."""
+    handle['predict'] = None
+    logging.info(f"Модель {handle['type']} версии {handle['version']} освобождена.")
+
+def get_warmup_frames(model_type):
+    """Возвращает кадры для прогрева модели: последние изображения датасета или синтетические кадры."""
+    if model_type == 'plate':
+        paths = glob.glob(os.path.join(DATASET_DIR, "cars", f"*.{DATASET_IMAGE_FORMAT}"))
+        height, width = PLATE_MODEL_IMGSZ
+    else:
+        paths = glob.glob(os.path.join(DATASET_DIR, "plate", f"*.{DATASET_IMAGE_FORMAT}"))
+        width, height = SYMBOL_CROP_SIZE or SYMBOL_MODEL_IMGSZ[::-1]
+
+    frames = []
+    for path in sorted(paths)[-MODEL_WARMUP_FRAMES:]:
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        if frame is not None:
+            frames.append(frame)
+    if not frames:
+        frames = [np.random.randint(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(MODEL_WARMUP_FRAMES)]
+    if model_type == 'symbol':
+        frames = [fit_symbol_crop(frame)[0] for frame in frames]
+    return frames
+
+def load_model_handle(model_type, model_path, backend, version):
+    """Загружает и прогревает новую версию модели, не затрагивая активную."""
+    imgsz = PLATE_MODEL_IMGSZ if model_type == 'plate' else SYMBOL_MODEL_IMGSZ
+    predict = load_model_backend(model_path, backend, imgsz)
+
+    frames = get_warmup_frames(model_type)
+    start = time.monotonic()
+    for _ in range(MODEL_WARMUP_RUNS):
+        predict(frames)
+    warmup_ms = (time.monotonic() - start) * 1000 / MODEL_WARMUP_RUNS
+
+    return {
+        'type': model_type,
+        'version': version,
+        'path': model_path,
+        'backend': resolve_model_backend(model_path, backend),
+        'predict': predict,
+        'in_flight': 0,
+        'retired': False,
+        'loaded_at': datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        'warmup_ms': round(warmup_ms, 3)
+    }
+
+def activate_model(handle):
+    """Атомарно делает версию модели активной для всех последующих вызовов инференса."""
+    with model_registry_lock:
+        previous = model_registry[handle['type']]
+        if previous is not None and previous['version'] > handle['version']:
+            # Более новая версия уже подменена запросом, загрузившимся раньше
+            free_model(handle)
+            return False
+        model_registry[handle['type']] = handle
+        if previous is not None:
+            previous['retired'] = True
+            if previous['in_flight'] == 0:
+                free_model(previous)
+    return True
+
+def load_model(model_type, model_path, backend=None, version=1):
+    """Загружает, прогревает и подменяет модель указанного типа; при ошибке активной остается прежняя версия."""
+    name = 'плат' if model_type == 'plate' else 'символов'
+    with model_load_lock:
+        with model_registry_lock:
+            model_status[model_type]['pending_version'] = version
+        try:
+            logging.info(f"Загрузка новой модели для {name} из {model_path} (версия {version})...")
+            handle = load_model_handle(model_type, model_path, backend, version)
+            if activate_model(handle):
+                logging.info(f"Новая модель для {name} загружена и прогрета за {handle['warmup_ms']:.1f} мс на батч.")
+            error = None
+        except Exception as e:
+            logging.error(f"Ошибка при загрузке модели для {name} из {model_path}: {e}")
+            error = f"версия {version}: {e}"
+        with model_registry_lock:
+            model_status[model_type]['pending_version'] = None
+            model_status[model_type]['last_error'] = error
+    return error is None
+
+def get_model_status():
+    """Возвращает активные версии моделей и состояние их загрузки в текущем процессе."""
+    status = {}
+    with model_registry_lock:
+        for model_type, handle in model_registry.items():
+            status[model_type] = dict(model_status[model_type])
+            if handle is not None:
+                status[model_type].update({key: handle[key] for key in ('version', 'path', 'backend', 'loaded_at', 'warmup_ms', 'in_flight')})
+    return status
+
 def update_metrics(model_type, detected):
     """Обновляет метрики для модели."""
-    if model_type in model_metrics:
-        model_metrics[model_type]['total_frames'] += 1
-        if detected:
-            model_metrics[model_type]['detected_frames'] += 1
-        model_metrics[model_type]['accuracy'] = (model_metrics[model_type]['detected_frames'] /
-                                                 model_metrics[model_type]['total_frames'])
+    with model_metrics_lock:
+        if model_type in model_metrics:
+            model_metrics[model_type]['total_frames'] += 1
+            if detected:
+                model_metrics[model_type]['detected_frames'] += 1
+            model_metrics[model_type]['accuracy'] = (model_metrics[model_type]['detected_frames'] /
+                                                     model_metrics[model_type]['total_frames'])
+
+def model_metrics_snapshot():
+    """Возвращает копию счетчиков кадров моделей текущего процесса."""
+    with model_metrics_lock:
+        return {model_type: dict(values) for model_type, values in model_metrics.items()}
 
 @app.route('/model_metrics', methods=['GET'])
 def get_model_metrics():
-    """Возвращает метрики моделей."""
-    return jsonify(model_metrics), 200
-
-def check_and_update_cameras():
-    """Проверяет изменения в базе данных камер и обновляет список камер и их состояния."""
-    global rect_cam, source_names, detection_states, stop_events, threads
+    """Возвращает метрики моделей и их активные версии."""
+    if not WORKER_PROCESSES:
+        status = get_model_status()
+        return jsonify({model_type: {**values, 'model': status[model_type]} for model_type, values in model_metrics_snapshot().items()}), 200
+
+    # Суммирование счетчиков всех процессов обработки
+    metrics = {model_type: {'total_frames': 0, 'detected_frames': 0, 'accuracy': 0.0} for model_type in model_metrics}
+    for worker_model_metrics in get_worker_metrics('model').values():
+        for model_type, values in worker_model_metrics.items():
+            metrics[model_type]['total_frames'] += values['total_frames']
+            metrics[model_type]['detected_frames'] += values['detected_frames']
+    for values in metrics.values():
+        if values['total_frames']:
+            values['accuracy'] = values['detected_frames'] / values['total_frames']
+    metrics['workers'] = get_worker_metrics('model_status')
+    return jsonify(metrics), 200
+
+def fetch_camera_from_db(camera_id):
+    """Извлекает данные одной камеры из базы данных."""
+    rows = db_read("SELECT id, url, x0, y0, x1, y1, name, capture_mode, enhance_mode, motion_threshold FROM cameras WHERE id = ?", (camera_id,))
+    return rows[0] if rows else None
+
+def camera_config(camera):
+    """Преобразует строку таблицы cameras в настройки камеры реестра."""
+    camera_id, url, x0, y0, x1, y1, name, capture_mode, enhance_mode, motion_threshold = camera
+    return {
+        'id': camera_id,
+        'url': url,
+        'name': name,
+        'rect_area': (x0, y0, x1, y1),
+        'capture_mode': resolve_capture_mode(url, capture_mode),
+        'enhance_mode': enhance_mode or 'full',
+        'motion_threshold': MOTION_THRESHOLD if motion_threshold is None else motion_threshold,
+        'context': None
+    }
+
+def is_own_camera(camera_id):
+    """Проверяет, обрабатывается ли камера текущим процессом."""
+    return worker_index is None or camera_id % WORKER_PROCESSES == worker_index
+
+def notify_camera_change(camera_id):
+    """Передает событие изменения камеры реестру и процессу обработки, которому принадлежит камера."""
+    camera_events.put(camera_id)
+    if WORKER_PROCESSES and worker_index is None and camera_id % WORKER_PROCESSES < len(worker_commands):
+        worker_commands[camera_id % WORKER_PROCESSES].put(('sync_camera', camera_id))
+
+def add_registered_camera(config):
+    """Регистрирует камеру и сразу запускает получение ее кадров."""
+    camera_id = config['id']
+    camera_registry[camera_id] = config
+    rect_cam[camera_id] = config['rect_area']
+    stop_events[camera_id] = threading.Event()
+    detection_states[camera_id] = {'detect_count': 0, 'no_detect_count': 0, 'detect_sec': 0, 'no_detect_sec': 0, 'plate_text': ''}
+    mark_camera_changed(camera_id)
+    if WORKER_PROCESSES and worker_index is None:
+        return  # Кадры камеры обрабатывает процесс обработки, сюда приходят только результаты
+    config['context'] = new_camera_context(camera_id, config['url'], clahe, config['rect_area'], config['name'], detection_states[camera_id], stop_events[camera_id],
+                                           config['capture_mode'], config['enhance_mode'], config['motion_threshold'])
+    threads[camera_id] = start_camera(config['context'])
+    logging.info(f"Камера {config['name']} запущена.")
+
+def remove_registered_camera(camera_id):
+    """Останавливает получение кадров камеры и удаляет ее состояние."""
+    config = camera_registry.pop(camera_id)
+    stop_camera(threads.pop(camera_id, None), stop_events.pop(camera_id))
+    del rect_cam[camera_id]
+    del detection_states[camera_id]
+    mark_camera_changed(camera_id)
+    remove_frame_slot(camera_id)
+    close_camera_session(camera_id)
+    logging.info(f"Камера {config['name']} остановлена.")
+
+def reconfigure_camera(config):
+    """Применяет новые настройки камеры: смена URL или режима получения кадров перезапускает камеру, остальное меняется на лету."""
+    current = camera_registry[config['id']]
+    if config['url'] != current['url'] or config['capture_mode'] != current['capture_mode']:
+        remove_registered_camera(config['id'])
+        add_registered_camera(config)
+        return
+
+    context = config['context'] = current['context']
+    if context is not None:
+        if config['rect_area'] != context['rect_area']:
+            context['motion_reference'] = None  # Опорный кадр фильтра движения относится к прежней ROI
+        # Поток или задача камеры читает настройки из контекста на каждом кадре
+        context['rect_area'] = config['rect_area']
+        context['source_name'] = config['name']
+        context['enhance_mode'] = config['enhance_mode']
+        context['motion_threshold'] = config['motion_threshold']
+    camera_registry[config['id']] = config
+    rect_cam[config['id']] = config['rect_area']
+    mark_camera_changed(config['id'])
+    logging.info(f"Настройки камеры {config['name']} обновлены.")
+
+def sync_camera(camera_id):
+    """Приводит камеру реестра к ее строке в базе данных: запускает, перенастраивает или останавливает только эту камеру."""
+    camera = fetch_camera_from_db(camera_id)
+    if camera is None or not is_own_camera(camera_id):
+        if camera_id in camera_registry:
+            remove_registered_camera(camera_id)
+    elif camera_id in camera_registry:
+        reconfigure_camera(camera_config(camera))
+    else:
+        add_registered_camera(camera_config(camera))
+
+def camera_registry_worker():
+    """Запускает камеры из базы данных и применяет события их изменения по мере поступления."""
+    for camera in fetch_cameras_from_db():
+        if is_own_camera(camera[0]):
+            add_registered_camera(camera_config(camera))
 
     while True:
-        # Извлечение данных камер из базы данных
-        cameras = fetch_cameras_from_db()
-        new_rect_cam = {}
-        new_source_names = []
-
-        for camera in cameras:
-            url, x0, y0, x1, y1, name = camera
-            new_rect_cam[url] = (x0, y0, x1, y1)
-            new_source_names.append(name)
-
-        # Обновление списка камер и их состояний
-        for url in list(rect_cam.keys()):
-            if url not in new_rect_cam:
-                # Удаление камеры
-                stop_events[url].set()
-                del rect_cam[url]
-                del detection_states[url]
-                del stop_events[url]
-
-        for url in new_rect_cam:
-            if url not in rect_cam:
-                # Добавление новой камеры
-                rect_cam[url] = new_rect_cam[url]
-                detection_states[url] = {'detect_count': 0, 'no_detect_count': 0, 'detect_sec': 0, 'no_detect_sec': 0, 'plate_text': ''}
-                stop_events[url] = threading.Event()
-                thread = threading.Thread(target=capture_frame, args=(url, plate_model, symbol_model, clahe, rect_cam[url], new_source_names[list(new_rect_cam.keys()).index(url)], detection_states[url], stop_events[url]))
-                threads.append(thread)
-                thread.start()
-
-        source_names = new_source_names
-        rect_cam = new_rect_cam
-
-        time.sleep(CAMERA_CHECK_INTERVAL)
+        camera_id = camera_events.get()
+        try:
+            sync_camera(camera_id)
+        except Exception as e:
+            logging.error(f"Ошибка применения изменений камеры {camera_id}: {e}")
+
+def mark_camera_changed(camera_id):
+    """Присваивает камере новую версию статуса и будит поток отправки обновлений."""
+    global status_sequence
+    with status_lock:
+        status_sequence += 1
+        camera_versions.pop(camera_id, None)
+        camera_versions[camera_id] = status_sequence
+    status_changed.set()
+
+def changed_cameras(since):
+    """Возвращает текущий номер последовательности и id камер, изменившихся после номера since."""
+    camera_ids = []
+    with status_lock:
+        for camera_id, version in reversed(camera_versions.items()):
+            if version <= since:
+                break
+            camera_ids.append(camera_id)
+        return status_sequence, camera_ids
+
+def camera_status(camera_id):
+    """Возвращает статус распознавания камеры или None, если камера удалена."""
+    config, detection_state = camera_registry.get(camera_id), detection_states.get(camera_id)
+    if config is None or detection_state is None:
+        return None
+    return {
+        'camera_id': camera_id,
+        'source': config['name'],
+        'detect_count': detection_state['detect_count'],
+        'no_detect_count': detection_state['no_detect_count'],
+        'detect_time': detection_state['detect_sec'],
+        'no_detect_time': detection_state['no_detect_sec'],
+        'plate_text': detection_state.get('plate_text', '')
+    }
+
+def status_delta(sequence, camera_ids):
+    """Собирает обновление статуса из изменившихся камер: текущий статус или признак удаления."""
+    cameras, removed = [], []
+    for camera_id in camera_ids:
+        status = camera_status(camera_id)
+        if status is None:
+            removed.append(camera_id)
+        else:
+            cameras.append(status)
+    return {'sequence': sequence, 'cameras': cameras, 'removed': removed}
+
+@socketio.on('connect')
+def connect_status_client():
+    """Регистрирует клиента WebSocket и отправляет ему статус всех камер."""
+    sequence, camera_ids = changed_cameras(0)
+    status_clients[request.sid] = {'sequence': sequence, 'last_emit': time.monotonic()}
+    emit('status_delta', status_delta(sequence, camera_ids))
+
+@socketio.on('disconnect')
+def disconnect_status_client(*args):
+    """Удаляет отключившегося клиента WebSocket."""
+    status_clients.pop(request.sid, None)
 
 def emit_status_updates():
-    """Отправляет обновления статуса через WebSocket."""
+    """Отправляет каждому клиенту WebSocket статус изменившихся камер по событиям детекции, не чаще STATUS_EMIT_MIN_INTERVAL."""
+    timeout = None
     while True:
-        status = []
-        for url, detection_state in detection_states.items():
-            source_name = source_names[list(detection_states.keys()).index(url)]
-            status.append({
-                'source': source_name,
-                'detect_count': detection_state['detect_count'],
-                'no_detect_count': detection_state['no_detect_count'],
-                'detect_time': detection_state['detect_sec'],
-                'no_detect_time': detection_state['no_detect_sec']
-            })
-        socketio.emit('status_update', status)
+        status_changed.wait(timeout)
+        status_changed.clear()
+        timeout = None
+        now = time.monotonic()
+        for sid, client in list(status_clients.items()):
+            sequence, camera_ids = changed_cameras(client['sequence'])
+            if not camera_ids:
+                continue
+            wait = client['last_emit'] + STATUS_EMIT_MIN_INTERVAL - now
+            if wait > 0:
+                # Изменения накапливаются до следующей разрешенной отправки клиенту
+                timeout = wait if timeout is None else min(timeout, wait)
+                continue
+            socketio.emit('status_delta', status_delta(sequence, camera_ids), to=sid)
+            client['sequence'], client['last_emit'] = sequence, now
 
-        plate_texts = []
-        for url, detection_state in detection_states.items():
-            source_name = source_names[list(detection_states.keys()).index(url)]
-            plate_texts.append({
-                'source_index': list(detection_states.keys()).index(url),
-                'source_name': source_name,
-                'plate_text': detection_state.get('plate_text', '')
-            })
-        socketio.emit('plate_text_update', plate_texts)
+def send_worker_event(event, block=False):
+    """Передает событие процессу веб-сервера и возвращает True; при заполненной очереди событие отбрасывается и возвращается False."""
+    try:
+        worker_events.put(event, block, WORKER_STATUS_INTERVAL if block else None)
+    except queue.Full:
+        return False
+    return True
 
-        time.sleep(1)
+def worker_reporter():
+    """Периодически отправляет процессу веб-сервера состояние изменившихся камер и метрики процесса обработки."""
+    sequence = 0
+    while True:
+        time.sleep(WORKER_STATUS_INTERVAL)
+        next_sequence, camera_ids = changed_cameras(sequence)
+        states = {camera_id: dict(detection_states[camera_id]) for camera_id in camera_ids if camera_id in detection_states}
+        # Номер последовательности сдвигается только после доставки: отброшенные изменения уйдут со следующей отправкой
+        if send_worker_event(('status', worker_index, states, process_metrics_snapshot()), block=True):
+            sequence = next_sequence
+
+def worker_event_listener(events):
+    """Принимает кадры и состояние камер от процессов обработки."""
+    while True:
+        event = events.get()
+        if event[0] == 'frame':
+            _, camera_id, frame, coordinates, plate_text = event
+            if camera_id in rect_cam:
+                publish_frame(camera_id, frame, coordinates, plate_text)
+        elif event[0] == 'ring_frame':
+            _, camera_id, index, slot_index, sequence, coordinates, plate_text = event
+            ring = frame_rings[index]
+            frame = read_ring_frame(ring, slot_index, sequence)
+            if frame is not None and camera_id in rect_cam:
+                publish_frame(camera_id, frame, coordinates, plate_text, (ring, slot_index, sequence))
+        elif event[0] == 'status':
+            _, index, states, metrics = event
+            for camera_id, state in states.items():
+                if camera_id in detection_states:
+                    detection_states[camera_id].update(state)
+                    mark_camera_changed(camera_id)
+            with worker_metrics_lock:
+                worker_metrics[index] = metrics
+
+def worker_main(index, count, events, commands, ring_name):
+    """Точка входа процесса обработки: загружает модели и обрабатывает свою часть камер."""
+    global worker_index, worker_events, frame_ring, viewed_cameras, WORKER_PROCESSES
+    worker_index, worker_events, WORKER_PROCESSES = index, events, count
+    frame_ring = create_frame_ring(ring_name)
+
+    # Потоки OpenCV делят ядра между процессами обработки
+    cv2.setNumThreads(max(1, (os.cpu_count() or 1) // count))
+
+    threading.Thread(target=db_writer, daemon=True).start()
+    start_pipeline()
+    threading.Thread(target=worker_reporter, daemon=True).start()
 
-def main():
-    global plate_model, symbol_model, clahe
+    while True:
+        command = commands.get()
+        if command[0] == 'update_model':
+            # Кадры продолжают обрабатываться прежней версией, пока новая загружается
+            threading.Thread(target=load_model, args=command[1:], daemon=True).start()
+        elif command[0] == 'sync_camera':
+            camera_events.put(command[1])
+        elif command[0] == 'viewed_cameras':
+            viewed_cameras = frozenset(command[1])
+
+def start_worker(context, index, events):
+    """Запускает процесс обработки с указанным номером."""
+    process = context.Process(target=worker_main, args=(index, WORKER_PROCESSES, events, worker_commands[index], frame_rings[index]['shm'].name),
+                              name=f"worker-{index}", daemon=True)
+    process.start()
+    logging.info(f"Запущен процесс обработки {index} (pid {process.pid}).")
+    return process
+
+def supervise_workers():
+    """Запускает процессы обработки и перезапускает завершившиеся."""
+    global worker_event_queue
+    context = multiprocessing.get_context('spawn')
+    events = worker_event_queue = context.Queue(maxsize=WORKER_EVENT_QUEUE_SIZE)
+    threading.Thread(target=worker_event_listener, args=(events,), daemon=True).start()
+
+    for index in range(WORKER_PROCESSES):
+        worker_commands.append(context.Queue())
+        # Буфер создается здесь, чтобы пережить перезапуск процесса обработки
+        frame_rings[index] = create_frame_ring()
+        atexit.register(frame_rings[index]['shm'].unlink)
+        worker_processes.append(start_worker(context, index, events))
+        with frame_bus_lock:
+            worker_commands[index].put(('viewed_cameras', get_viewed_cameras(index)))
+
+    while True:
+        time.sleep(WORKER_RESTART_INTERVAL)
+        for index, process in enumerate(worker_processes):
+            if not process.is_alive():
+                logging.error(f"Процесс обработки {index} завершился с кодом {process.exitcode}, перезапуск.")
+                worker_processes[index] = start_worker(context, index, events)
+                for command in list(worker_model_updates.values()):
+                    worker_commands[index].put(command)
+                with frame_bus_lock:
+                    worker_commands[index].put(('viewed_cameras', get_viewed_cameras(index)))
+
+def start_pipeline():
+    """Загружает модели и запускает обработку камер в текущем процессе."""
+    global clahe
 
     logging.info("Загрузка модели YOLO для плат...")
-    plate_model = YOLO("models/plate.pt")
+    activate_model(load_model_handle('plate', PLATE_MODEL_PATH, PLATE_MODEL_BACKEND, 1))
     logging.info("Модель для плат загружена.")
 
     logging.info("Загрузка модели YOLO для символов...")
-    symbol_model = YOLO("models/symbols.pt")
+    activate_model(load_model_handle('symbol', SYMBOL_MODEL_PATH, SYMBOL_MODEL_BACKEND, 1))
     logging.info("Модель для символов загружена.")
 
     clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
 
-    create_table_if_not_exists()  # Создание таблицы, если она не существует
-    migrate_table()  # Обновление таблицы, добавляя новые столбцы, если они отсутствуют
+    # Загрузка недавних номеров в кэш и запуск потока записи его счетчиков
+    warm_plate_cache()
+    threading.Thread(target=plate_cache_flusher, daemon=True).start()
+
+    # Запуск потока батчевого инференса для всех камер
+    threading.Thread(target=inference_worker, daemon=True).start()
+
+    # Запуск потоков фоновой записи датасета
+    for _ in range(DATASET_WRITER_WORKERS):
+        threading.Thread(target=dataset_writer, daemon=True).start()
+
+    # Запуск камер и потока применения изменений их настроек
+    threading.Thread(target=camera_registry_worker, daemon=True).start()
 
-    # Запуск потока для проверки изменений в базе данных камер
-    threading.Thread(target=check_and_update_cameras, daemon=True).start()
+def main():
+    migrate_database()  # Создание таблиц и применение недостающих миграций схемы
+
+    # Запуск единственного потока записи в базу данных
+    threading.Thread(target=db_writer, daemon=True).start()
+
+    # Перевод старых записей на время в секундах эпохи в фоне
+    threading.Thread(target=backfill_record_time, daemon=True).start()
+
+    # Доставка распознаваний вышестоящему серверу из процесса веб-сервера, в том числе записанных процессами обработки
+    if OUTBOX_URL is not None:
+        threading.Thread(target=outbox_sender, daemon=True).start()
+
+    if WORKER_PROCESSES:
+        # Камеры обрабатываются отдельными процессами, здесь отслеживается только список камер
+        threading.Thread(target=supervise_workers, daemon=True).start()
+        threading.Thread(target=camera_registry_worker, daemon=True).start()
+    else:
+        start_pipeline()
 
     # Запуск потока для отправки обновлений статуса через WebSocket
     threading.Thread(target=emit_status_updates, daemon=True).start()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сервер распознавания автомобильных номеров")
+    parser.add_argument("--workers", type=int, default=WORKER_PROCESSES,
+                        help="Количество процессов обработки камер (0 - обработка в процессе веб-сервера)")
+    parser.add_argument("--outbox-url", default=OUTBOX_URL, help="Адрес вышестоящего сервера для доставки распознаваний")
+    args = parser.parse_args()
+    WORKER_PROCESSES = max(0, args.workers)
+    OUTBOX_URL = args.outbox_url
+
     threading.Thread(target=main).start()
     socketio.run(app, host='0.0.0.0', port=5000)
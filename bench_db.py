@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import app
+
+
+def create_legacy_database(path, rows, plates, sources, days):
+    """Создает базу со схемой до версионирования и заполняет ее записями."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    app.migration_base_schema(conn)
+    now = int(datetime.now(timezone.utc).timestamp())
+    plate_keys = [f"A{index:03d}BC{index % 100:02d}" for index in range(plates)]
+    source_names = [f"Камера {index}" for index in range(sources)]
+
+    def generate():
+        for index in range(rows):
+            # Записи равномерно распределены по времени, последние - в окне поиска
+            record_time = now - (rows - index) * days * 86400 // rows
+            yield (
+                datetime.fromtimestamp(record_time, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                random.choice(plate_keys), 0, 0, 100, 40, 0.9, "plate.jpg", "car.jpg",
+                random.choice(source_names), 6, 6.0, 0.0, 0, 1, 0.0
+            )
+
+    conn.executemany("""
+        INSERT INTO record (
+            datetime, key, x0, y0, x1, y1, ratio, photo_plate, photo_care, source,
+            detect_count, detect_sec, no_detect_sec, send_to_server_code, match_count, time_in_view
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, generate())
+    conn.commit()
+    return conn, plate_keys, source_names
+
+
+def measure(conn, query, make_params, lookups):
+    """Возвращает задержки запроса поиска в микросекундах."""
+    latencies = []
+    for _ in range(lookups):
+        params = make_params()
+        start = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def summarize(latencies):
+    """Возвращает перцентили задержек в микросекундах."""
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {'p50_us': round(quantiles[49], 1), 'p95_us': round(quantiles[94], 1), 'p99_us': round(quantiles[98], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер задержки поиска номера в таблице record до и после миграции")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Количество записей")
+    parser.add_argument("--plates", type=int, default=20000, help="Количество различных номеров")
+    parser.add_argument("--sources", type=int, default=20, help="Количество камер")
+    parser.add_argument("--days", type=int, default=180, help="Период, за который распределены записи (в днях)")
+    parser.add_argument("--lookups", type=int, default=200, help="Количество поисковых запросов")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        start = time.perf_counter()
+        conn, plate_keys, source_names = create_legacy_database(path, args.rows, args.plates, args.sources, args.days)
+        report = {'rows': args.rows, 'fill_sec': round(time.perf_counter() - start, 2)}
+
+        def legacy_params():
+            search_time = datetime.now(timezone.utc).timestamp() - app.SEARCH_TIME_WINDOW
+            return (random.choice(plate_keys), random.choice(source_names),
+                    datetime.fromtimestamp(search_time, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"))
+
+        legacy_query = "SELECT id, match_count, datetime FROM record WHERE key = ? AND source = ? AND datetime >= ?"
+        report['legacy_lookup'] = summarize(measure(conn, legacy_query, legacy_params, args.lookups))
+
+        start = time.perf_counter()
+        app.apply_migrations(conn)
+        report['migration_sec'] = round(time.perf_counter() - start, 2)
+
+        start = time.perf_counter()
+        report['backfilled_rows'] = app.backfill_record_time(conn)
+        report['backfill_sec'] = round(time.perf_counter() - start, 2)
+
+        def indexed_params():
+            search_time = int(datetime.now(timezone.utc).timestamp() - app.SEARCH_TIME_WINDOW)
+            return (random.choice(plate_keys), random.choice(source_names), search_time)
+
+        indexed_query = """
+            SELECT id, match_count, time FROM record
+            WHERE key = ? AND source = ? AND time >= ?
+            ORDER BY time DESC LIMIT 1
+        """
+        report['indexed_lookup'] = summarize(measure(conn, indexed_query, indexed_params, args.lookups))
+        report['query_plan'] = [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + indexed_query, indexed_params())]
+        conn.close()
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
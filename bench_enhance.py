@@ -0,0 +1,73 @@
+import argparse
+import glob
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from app import DATASET_DIR, ENHANCE_MODES, enhance_frame
+
+
+def load_frames(images_dir, limit, size):
+    """Загружает кадры для замера или создает синтетический кадр заданного размера."""
+    frames = []
+    for path in sorted(glob.glob(os.path.join(images_dir, "*.jpg")))[:limit]:
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        if frame is not None:
+            frames.append(frame)
+    if not frames:
+        width, height = size
+        frames.append(np.random.randint(0, 256, (height, width, 3), dtype=np.uint8))
+    return frames
+
+
+def measure(frames, roi_fraction, repeats, enhance):
+    """Возвращает процессорное время обработки одного кадра в миллисекундах."""
+    enhance(frames[0], (0, 0, frames[0].shape[1], frames[0].shape[0]))  # Прогрев
+    start = time.process_time()
+    for _ in range(repeats):
+        for frame in frames:
+            height, width = frame.shape[:2]
+            roi_width, roi_height = int(width * roi_fraction), int(height * roi_fraction)
+            enhance(frame, (0, 0, roi_width, roi_height))
+    return (time.process_time() - start) * 1000 / (repeats * len(frames))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер затрат CPU на улучшение контраста по режимам")
+    parser.add_argument("--images", default=os.path.join(DATASET_DIR, "cars"), help="Директория с кадрами JPEG")
+    parser.add_argument("--limit", type=int, default=50, help="Максимальное количество кадров")
+    parser.add_argument("--size", type=int, nargs=2, default=(2592, 1944), help="Размер синтетического кадра, если кадров нет")
+    parser.add_argument("--roi-fraction", type=float, default=0.58, help="Доля ширины и высоты кадра, занимаемая ROI")
+    parser.add_argument("--repeats", type=int, default=5, help="Количество повторов")
+    args = parser.parse_args()
+
+    frames = load_frames(args.images, args.limit, args.size)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    cv2.setNumThreads(1)  # Замер на одном ядре, как в потоке камеры
+
+    def legacy(frame, rect_area):
+        # Прежний путь: CLAHE по всему кадру, затем обрезка
+        x0, y0, x1, y1 = rect_area
+        return enhance_frame(frame, clahe, 'full')[y0:y1, x0:x1]
+
+    baseline = measure(frames, args.roi_fraction, args.repeats, legacy)
+    report = {'frames': len(frames), 'roi_fraction': args.roi_fraction, 'legacy_full_frame_ms': round(baseline, 3), 'modes': {}}
+    for mode in ENHANCE_MODES:
+        def roi_only(frame, rect_area, mode=mode):
+            x0, y0, x1, y1 = rect_area
+            return enhance_frame(frame[y0:y1, x0:x1], clahe, mode)
+
+        cpu_ms = measure(frames, args.roi_fraction, args.repeats, roi_only)
+        report['modes'][mode] = {
+            'cpu_ms_per_frame': round(cpu_ms, 3),
+            'saved_vs_legacy_pct': round((1 - cpu_ms / baseline) * 100, 1) if baseline else 0.0
+        }
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
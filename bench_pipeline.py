@@ -0,0 +1,205 @@
+import argparse
+import glob
+import http.server
+import json
+import os
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+import psutil
+
+import app
+
+
+def load_jpegs(images_dir, limit, size):
+    """Загружает JPEG для воспроизведения или кодирует синтетические кадры, если директория пуста."""
+    jpegs = []
+    for path in sorted(glob.glob(os.path.join(images_dir, "*.jpg")))[:limit]:
+        with open(path, "rb") as f:
+            jpegs.append(f.read())
+    if not jpegs:
+        width, height = size
+        for _ in range(min(limit, 8)):
+            frame = np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)
+            jpegs.append(cv2.imencode(".jpg", frame)[1].tobytes())
+    return jpegs
+
+
+def start_snapshot_server(jpegs, cameras):
+    """Запускает локальный HTTP-сервер, отдающий каждой камере /cam<N> кадры записи по кругу."""
+    positions = [index * len(jpegs) // cameras for index in range(cameras)]  # Камеры смещены по записи
+    lock = threading.Lock()
+
+    class SnapshotHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, как у сессий камер в app.py
+
+        def do_GET(self):
+            try:
+                camera = int(self.path.rsplit("cam", 1)[1])
+            except (IndexError, ValueError):
+                self.send_error(404)
+                return
+            with lock:
+                body = jpegs[positions[camera] % len(jpegs)]
+                positions[camera] += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SnapshotHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def reset_metrics():
+    """Сбрасывает гистограммы этапов и счетчики камер после прогрева."""
+    with app.stage_metrics_lock:
+        app.stage_metrics.clear()
+    with app.camera_lock:
+        for url in app.camera_stats:
+            app.camera_stats[url] = app.new_camera_stats()
+
+
+def summarize_stages():
+    """Возвращает количество и перцентили длительности этапов по всем камерам в миллисекундах."""
+    stages = {}
+    for (stage, _), histogram in app.stage_metrics_snapshot().items():
+        merged = stages.setdefault(stage, {'counts': [0] * len(histogram['counts']), 'sum': 0.0})
+        merged['counts'] = [a + b for a, b in zip(merged['counts'], histogram['counts'])]
+        merged['sum'] += histogram['sum']
+
+    report = {}
+    for stage, histogram in sorted(stages.items()):
+        count = sum(histogram['counts'])
+        report[stage] = {
+            'count': count,
+            'mean_ms': round(histogram['sum'] / count * 1000, 3) if count else 0.0,
+            'p50_ms': round(app.histogram_quantile(0.5, histogram['counts']) * 1000, 3),
+            'p95_ms': round(app.histogram_quantile(0.95, histogram['counts']) * 1000, 3),
+            'p99_ms': round(app.histogram_quantile(0.99, histogram['counts']) * 1000, 3)
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных кадров через конвейер распознавания на симулированных камерах")
+    parser.add_argument("--images", default=os.path.join(app.DATASET_DIR, "cars"), help="Директория с кадрами JPEG")
+    parser.add_argument("--limit", type=int, default=200, help="Максимальное количество кадров записи")
+    parser.add_argument("--size", type=int, nargs=2, default=(2592, 1944), help="Размер синтетического кадра, если кадров нет")
+    parser.add_argument("--cameras", type=int, default=4, help="Количество симулированных камер")
+    parser.add_argument("--duration", type=float, default=30, help="Длительность замера (в секундах)")
+    parser.add_argument("--warmup", type=float, default=5, help="Длительность прогрева перед замером (в секундах)")
+    parser.add_argument("--interval", type=float, default=0.0, help="Минимальная пауза между кадрами камеры (0 - максимальная нагрузка)")
+    parser.add_argument("--engine", choices=app.INGEST_ENGINES, default=app.INGEST_ENGINE, help="Движок опроса камер")
+    parser.add_argument("--enhance-mode", choices=app.ENHANCE_MODES, default="full", help="Режим улучшения контраста")
+    parser.add_argument("--motion-threshold", type=float, default=0.0, help="Порог фильтра движения (0 - без фильтра)")
+    parser.add_argument("--plate", default=app.PLATE_MODEL_PATH, help="Модель плат")
+    parser.add_argument("--symbols", default=app.SYMBOL_MODEL_PATH, help="Модель символов")
+    parser.add_argument("--backend", choices=app.MODEL_BACKENDS, default=None, help="Бэкенд обеих моделей (по умолчанию по пути модели)")
+    parser.add_argument("--save-dataset", action="store_true", help="Сохранять датасет во временную директорию, как в работе")
+    parser.add_argument("--output", help="Файл для сохранения отчета JSON")
+    args = parser.parse_args()
+
+    jpegs = load_jpegs(args.images, args.limit, args.size)
+    height, width = cv2.imdecode(np.frombuffer(jpegs[0], dtype=np.uint8), cv2.IMREAD_COLOR).shape[:2]
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Отдельные база и датасет, чтобы не засорять рабочие
+        app.DB_PATH = os.path.join(directory, "bench.db")
+        app.DATASET_DIR = directory
+        app.SAVE_DATASET = args.save_dataset
+        for subdir in ("cars", "plate"):
+            os.makedirs(os.path.join(directory, subdir), exist_ok=True)
+        app.INGEST_ENGINE = args.engine
+        app.FETCH_IMAGE_DELAY = args.interval
+        app.PROCESSING_INTERVAL = app.ACTIVE_PROCESSING_INTERVAL = app.IDLE_PROCESSING_INTERVAL = args.interval
+
+        app.migrate_database()
+        threading.Thread(target=app.db_writer, daemon=True).start()
+        threading.Thread(target=app.inference_worker, daemon=True).start()
+        for _ in range(app.DATASET_WRITER_WORKERS):
+            threading.Thread(target=app.dataset_writer, daemon=True).start()
+        threading.Thread(target=app.plate_cache_flusher, daemon=True).start()
+        app.activate_model(app.load_model_handle('plate', args.plate, args.backend, 1))
+        app.activate_model(app.load_model_handle('symbol', args.symbols, args.backend, 1))
+
+        server = start_snapshot_server(jpegs, args.cameras)
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        stop_event = threading.Event()
+        workers = []
+        for index in range(args.cameras):
+            url = f"http://127.0.0.1:{server.server_port}/cam{index}"
+            state = {'detect_count': 0, 'no_detect_count': 0, 'detect_sec': 0, 'no_detect_sec': 0, 'plate_text': ''}
+            context = app.new_camera_context(index, url, clahe, (0, 0, width, height), f"Камера {index}", state,
+                                             stop_event, 'snapshot', args.enhance_mode, args.motion_threshold)
+            workers.append(app.start_camera(context))
+
+        time.sleep(args.warmup)
+        reset_metrics()
+        process = psutil.Process()
+        rss_start = process.memory_info().rss
+        cpu_start = process.cpu_times()
+        rss_peak = rss_start
+        start = time.monotonic()
+        while time.monotonic() - start < args.duration:
+            time.sleep(0.5)
+            rss_peak = max(rss_peak, process.memory_info().rss)
+        elapsed = time.monotonic() - start
+        cpu_end = process.cpu_times()
+        stats = app.camera_stats_snapshot()
+        stages = summarize_stages()
+
+        for worker in workers:
+            app.stop_camera(worker, stop_event)
+            if isinstance(worker, threading.Thread):
+                worker.join(timeout=5)
+        app.dataset_queue.join()  # Дописывание датасета до удаления временной директории
+        server.shutdown()
+
+    processed = sum(camera_stat['processed_frames'] for camera_stat in stats.values())
+    skipped = sum(camera_stat['skipped_frames'] for camera_stat in stats.values())
+    cpu_seconds = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+    report = {
+        'config': {
+            'cameras': args.cameras, 'frames': len(jpegs), 'frame_size': [width, height], 'duration_sec': round(elapsed, 2),
+            'interval': args.interval, 'engine': args.engine, 'enhance_mode': args.enhance_mode, 'motion_threshold': args.motion_threshold,
+            'plate_model': args.plate, 'symbol_model': args.symbols,
+            'backend': {'plate': app.resolve_model_backend(args.plate, args.backend), 'symbol': app.resolve_model_backend(args.symbols, args.backend)},
+            'inference_batch_size': app.INFERENCE_BATCH_SIZE, 'inference_threads': app.get_inference_threads()
+        },
+        'fps': {
+            'total': round((processed + skipped) / elapsed, 2),
+            'processed': round(processed / elapsed, 2),
+            'per_camera': round((processed + skipped) / elapsed / args.cameras, 2)
+        },
+        'frames': {'processed': processed, 'skipped': skipped, 'errors': sum(camera_stat['errors'] for camera_stat in stats.values())},
+        'stages': stages,
+        'cpu': {
+            'cores_used': round(cpu_seconds / elapsed, 2),
+            'machine_percent': round(cpu_seconds / elapsed / (os.cpu_count() or 1) * 100, 1)
+        },
+        'rss_mb': {
+            'start': round(rss_start / 2 ** 20, 1),
+            'end': round(process.memory_info().rss / 2 ** 20, 1),
+            'peak': round(rss_peak / 2 ** 20, 1)
+        }
+    }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import argparse
+import json
+import os
+
+from ultralytics import YOLO
+
+from app import PLATE_MODEL_IMGSZ, SYMBOL_MODEL_IMGSZ
+
+
+def export_model(model_path, export_format, imgsz, dynamic_batch):
+    """Экспортирует модель .pt в ONNX или OpenVINO с фиксированным размером входа и возвращает путь к результату."""
+    model = YOLO(model_path)
+    # Размер входа при инференсе всегда равен imgsz, dynamic=True нужен только для переменного батча
+    return model.export(format=export_format, imgsz=list(imgsz), dynamic=dynamic_batch, simplify=export_format == 'onnx')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт моделей плат и символов для бэкендов ONNX Runtime и OpenVINO")
+    parser.add_argument("--format", choices=("onnx", "openvino"), default="onnx", help="Формат экспорта")
+    parser.add_argument("--plate", default=os.path.join("models", "plate.pt"), help="Модель плат .pt")
+    parser.add_argument("--symbols", default=os.path.join("models", "symbols.pt"), help="Модель символов .pt")
+    parser.add_argument("--plate-imgsz", type=int, nargs=2, default=PLATE_MODEL_IMGSZ, help="Размер входа модели плат (высота ширина)")
+    parser.add_argument("--symbol-imgsz", type=int, nargs=2, default=SYMBOL_MODEL_IMGSZ, help="Размер входа модели символов (высота ширина)")
+    parser.add_argument("--static-batch", action="store_true", help="Экспорт с батчем 1 (кадры батча прогоняются по одному)")
+    args = parser.parse_args()
+
+    report = {}
+    for name, model_path, imgsz in (("plate", args.plate, args.plate_imgsz), ("symbol", args.symbols, args.symbol_imgsz)):
+        report[name] = {'source': model_path, 'imgsz': list(imgsz),
+                        'exported': export_model(model_path, args.format, imgsz, not args.static_batch)}
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import http.server
+import json
+import random
+import threading
+import time
+
+
+def make_handler(args, stats, lock):
+    """Создает обработчик, принимающий пачки записей на /records и отдающий статистику на /stats."""
+
+    class OutboxHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, как у сессии доставки в app.py
+
+        def send_json(self, code, body):
+            data = json.dumps(body, ensure_ascii=False).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path != "/stats":
+                self.send_error(404)
+                return
+            with lock:
+                self.send_json(200, {key: value for key, value in stats.items() if key != 'ids'})
+
+        def do_POST(self):
+            if self.path != "/records":
+                self.send_error(404)
+                return
+            try:
+                records = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))['records']
+            except (ValueError, KeyError):
+                self.send_json(400, {"error": "ожидается {\"records\": [...]}"})
+                return
+            if args.delay:
+                time.sleep(args.delay)
+
+            with lock:
+                stats['requests'] += 1
+                if random.random() < args.fail_rate:
+                    stats['failed_requests'] += 1
+                    self.send_json(503, {"error": "временная ошибка"})
+                    return
+                if args.reject_plate and any((record.get('key') or '').startswith(args.reject_plate) for record in records):
+                    stats['rejected_requests'] += 1
+                    self.send_json(422, {"error": f"номера с префиксом {args.reject_plate} не принимаются"})
+                    return
+                ids = [record['id'] for record in records]
+                stats['duplicates'] += sum(record_id in stats['ids'] for record_id in ids)
+                stats['ids'].update(ids)
+                stats['accepted'] = len(stats['ids'])
+                stats['batches'] += 1
+            self.send_json(200, {"accepted": len(ids)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return OutboxHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка вышестоящего сервера для проверки доставки распознаваний")
+    parser.add_argument("--host", default="127.0.0.1", help="Адрес для прослушивания")
+    parser.add_argument("--port", type=int, default=8090, help="Порт для прослушивания")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Доля запросов, на которые отвечать 503 (0-1)")
+    parser.add_argument("--reject-plate", help="Отвечать 422 на пачки с номерами, начинающимися с этого префикса")
+    parser.add_argument("--delay", type=float, default=0.0, help="Задержка ответа (в секундах)")
+    args = parser.parse_args()
+
+    stats = {'requests': 0, 'batches': 0, 'accepted': 0, 'duplicates': 0, 'failed_requests': 0, 'rejected_requests': 0, 'ids': set()}
+    lock = threading.Lock()
+    server = http.server.ThreadingHTTPServer((args.host, args.port), make_handler(args, stats, lock))
+    server.daemon_threads = True
+    print(f"Прием записей: http://{args.host}:{args.port}/records, статистика: http://{args.host}:{args.port}/stats")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import argparse
+import glob
+import json
+import os
+import random
+import statistics
+import time
+
+import cv2
+import onnxruntime as ort
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+import app
+
+
+def load_samples(plate_dir):
+    """Загружает вырезки плат с файлами разметки YOLO и возвращает пары (изображение, эталонный номер)."""
+    samples = []
+    for label_path in sorted(glob.glob(os.path.join(plate_dir, "*_plate.txt"))):
+        image_paths = [path for path in glob.glob(os.path.splitext(label_path)[0] + ".*") if not path.endswith(".txt")]
+        if not image_paths:
+            continue
+        image = cv2.imread(image_paths[0], cv2.IMREAD_COLOR)
+        with open(label_path) as f:
+            labels = [line.split() for line in f if line.strip()]
+        if image is None or not labels:
+            continue
+        # Эталонный номер - классы символов слева направо по центру рамки
+        labels.sort(key=lambda label: float(label[1]))
+        samples.append((image, ''.join(app.CLASS_TO_SYMBOL[int(label[0])] for label in labels)))
+    return samples
+
+
+def prepare_input(plate_img):
+    """Приводит вырезку платы к входу батча модели символов, как при обработке кадров."""
+    return app.fit_symbol_crop(plate_img)
+
+
+class PlateCropReader(CalibrationDataReader):
+    """Подает вырезки плат на калибровку диапазонов активаций."""
+
+    def __init__(self, input_name, imgsz, images):
+        self.tensors = iter([app.letterbox_batch([prepare_input(image)[0]], imgsz)[0] for image in images])
+        self.input_name = input_name
+
+    def get_next(self):
+        tensor = next(self.tensors, None)
+        return None if tensor is None else {self.input_name: tensor}
+
+
+def get_model_imgsz(session):
+    """Возвращает размер входа модели, зафиксированный при экспорте, или SYMBOL_MODEL_IMGSZ."""
+    _, _, height, width = session.get_inputs()[0].shape
+    if isinstance(height, int) and isinstance(width, int):
+        return height, width
+    return app.SYMBOL_MODEL_IMGSZ
+
+
+def character_accuracy(predicted, reference):
+    """Возвращает посимвольную точность как 1 - расстояние Левенштейна / длина эталона."""
+    distances = list(range(len(predicted) + 1))
+    for i, reference_char in enumerate(reference, 1):
+        previous, distances[0] = distances[0], i
+        for j, predicted_char in enumerate(predicted, 1):
+            previous, distances[j] = distances[j], min(distances[j] + 1, distances[j - 1] + 1, previous + (reference_char != predicted_char))
+    return max(0.0, 1 - distances[-1] / max(len(reference), 1))
+
+
+def evaluate(model_path, samples):
+    """Возвращает посимвольную точность, долю полностью верных номеров и задержку модели на одной плате."""
+    predict = app.load_model_backend(model_path, 'onnx', app.SYMBOL_MODEL_IMGSZ)
+    predict([prepare_input(samples[0][0])[0]])  # Прогрев
+
+    accuracies, exact, latencies = [], 0, []
+    for image, reference in samples:
+        symbol_input, scale_x = prepare_input(image)
+        start = time.perf_counter()
+        result = predict([symbol_input])[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        _, plate_text = app.decode_plate_symbols(result, scale_x)
+        accuracies.append(character_accuracy(plate_text, reference))
+        exact += plate_text == reference
+
+    return {
+        'char_accuracy': round(statistics.mean(accuracies), 4),
+        'plate_accuracy': round(exact / len(samples), 4),
+        'latency_ms_p50': round(statistics.median(latencies), 3),
+        'latency_ms_mean': round(statistics.mean(latencies), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Статическое INT8-квантование модели символов ONNX с проверкой точности на датасете плат")
+    parser.add_argument("--model", default=os.path.join("models", "symbols.onnx"), help="Исходная модель символов ONNX (FP32)")
+    parser.add_argument("--output", default=os.path.join("models", "symbols_int8.onnx"), help="Путь к квантованной модели")
+    parser.add_argument("--plates", default=os.path.join(app.DATASET_DIR, "plate"), help="Директория вырезок плат с разметкой YOLO")
+    parser.add_argument("--calibration", type=int, default=200, help="Количество плат для калибровки")
+    parser.add_argument("--eval", type=int, default=1000, help="Максимальное количество плат для оценки точности")
+    parser.add_argument("--threads", type=int, default=1, help="Количество потоков инференса при замере задержки")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно разбиения датасета на калибровку и оценку")
+    args = parser.parse_args()
+
+    samples = load_samples(args.plates)
+    if len(samples) <= args.calibration:
+        parser.error(f"Недостаточно размеченных плат в {args.plates}: {len(samples)}, нужно больше {args.calibration}")
+    random.Random(args.seed).shuffle(samples)
+    calibration, evaluation = samples[:args.calibration], samples[args.calibration:args.calibration + args.eval]
+
+    # Вывод форм тензоров и упрощение графа перед квантованием
+    preprocessed_path = os.path.splitext(args.output)[0] + "_prep.onnx"
+    quant_pre_process(args.model, preprocessed_path)
+    session = ort.InferenceSession(preprocessed_path, providers=['CPUExecutionProvider'])
+    reader = PlateCropReader(session.get_inputs()[0].name, get_model_imgsz(session), [image for image, _ in calibration])
+    quantize_static(preprocessed_path, args.output, reader, quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    os.remove(preprocessed_path)
+
+    app.INFERENCE_THREADS = args.threads
+    fp32, int8 = evaluate(args.model, evaluation), evaluate(args.output, evaluation)
+    accuracy_drop = round(fp32['char_accuracy'] - int8['char_accuracy'], 4)
+    report = {
+        'model': args.model,
+        'quantized_model': args.output,
+        'calibration_samples': len(calibration),
+        'eval_samples': len(evaluation),
+        'fp32': fp32,
+        'int8': int8,
+        'accuracy_drop': accuracy_drop,
+        'speedup': round(fp32['latency_ms_p50'] / int8['latency_ms_p50'], 2) if int8['latency_ms_p50'] else 0.0,
+        'max_accuracy_drop': app.QUANTIZED_MAX_ACCURACY_DROP,
+        'deployable': accuracy_drop <= app.QUANTIZED_MAX_ACCURACY_DROP
+    }
+
+    # Отчет рядом с моделью проверяется при загрузке через /update_model
+    with open(app.get_quantization_report_path(args.output), 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()